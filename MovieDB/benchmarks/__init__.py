@@ -0,0 +1 @@
+# Performance benchmarks, run from the MovieDB folder with "python -m benchmarks"
@@ -0,0 +1,87 @@
+import os
+import sys
+import argparse
+import tempfile
+
+from catalog import CATALOG_PATH
+
+from .generate import Vocabulary, generate_library, write_catalog_file
+from .timing import compare_results, load_results, print_results, write_results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description="Time the data layer or the windows against a generated movie library.")
+    parser.add_argument('suite', nargs='?', choices=['data', 'gui'], default='data',
+                        help="data for the queries, imports and catalog, gui for the windows "
+                             "under the offscreen Qt platform")
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--movies', type=int, default=50000, help="movies per user")
+    parser.add_argument('--import-sizes', type=int, nargs='*', default=[10000, 100000, 1000000],
+                        help="rows of each timed file import, none to skip them")
+    parser.add_argument('--catalog-rows', type=int, default=20000,
+                        help="size of the IMDB catalog the gui suite opens")
+    parser.add_argument('--dump-titles', type=int, default=0,
+                        help="titles of generated IMDb dataset files the data suite ingests, "
+                             "0 to skip it")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--catalog', default=CATALOG_PATH)
+    parser.add_argument('--database', help="reuse this generated library instead of a new one")
+    parser.add_argument('--work-dir', help="where the library and import files are written")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help="results of an earlier run")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="slowdown reported as a regression, 0.10 for 10%%")
+    args = parser.parse_args(argv)
+
+    # The gui suite changes into the work directory, so paths are made absolute first
+    catalog = os.path.abspath(args.catalog)
+    output = os.path.abspath(args.output)
+    work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix='moviedb-bench-'))
+    os.makedirs(work_dir, exist_ok=True)
+    vocabulary = Vocabulary(catalog)
+    database = os.path.abspath(args.database) if args.database else None
+    if database is None:
+        database = os.path.join(work_dir, 'moviedb.sqlite')
+        print(f"Generating {args.users} users with {args.movies} movies each in {database}",
+              file=sys.stderr)
+        user_ids = generate_library(database, vocabulary, args.users, args.movies, args.seed)
+        user_id = user_ids[0]
+    else:
+        # Libraries from generate_library number their users from 1
+        user_id = 1
+
+    if args.suite == 'gui':
+        from . import gui
+
+        # The windows open the files the app would, by name in the working directory
+        if database != os.path.join(work_dir, 'moviedb.sqlite'):
+            parser.error("the gui suite needs the library in its work directory, "
+                         "pass --work-dir instead of --database")
+        write_catalog_file(catalog, os.path.join(work_dir, CATALOG_PATH), args.catalog_rows)
+        results = gui.run(work_dir, user_id, args.repeat)
+    else:
+        from . import data_layer
+
+        results = data_layer.run(database, vocabulary, user_id, catalog, work_dir, args.repeat,
+                                 args.import_sizes, args.seed, args.dump_titles)
+
+    settings = {name: value for name, value in vars(args).items()
+                if name not in ('output', 'compare', 'work_dir')}
+    write_results(output, args.suite, settings, results)
+    print_results(results)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        lines, regressions = compare_results(load_results(args.compare), load_results(output),
+                                             args.threshold)
+        print('\n'.join(lines))
+        if regressions:
+            print(f"{len(regressions)} benchmarks more than {args.threshold:.0%} slower",
+                  file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import os
+import time
+import shutil
+
+from catalog import parse_catalog_csv, load_catalog_snapshot, snapshot_path
+from database import (CATALOG_SORT_FIELDS, MOVIE_COLUMNS, MOVIE_ROW_COLUMNS, SORT_OPTIONS,
+                      MovieRepository)
+from importer import import_file, undo_import
+from models import DEFAULT_PAGE_SIZE
+
+from .generate import (BENCHMARK_PASSWORD, IMPORT_MAPPING, password_hash, synthetic_movies,
+                       write_imdb_dump, write_import_file)
+from .timing import timed, summarize
+
+# Filters as typed into the main window, run with and without every sort option
+FILTERS = {
+    'all': {},
+    'genre': {'genre_filter': 'Drama'},
+    'genre_and': {'genre_filter': 'Drama, Crime'},
+    'genre_or': {'genre_filter': 'Comedy | Horror'},
+    'actor': {'actor_filter': 'Tom Hanks'},
+    'search': {'search': 'the'},
+    'search_word': {'search': 'godfather'},
+}
+
+CATALOG_SEARCHES = ['the', 'nolan', 'godfather', 'tom hanks', 'star wars', 'drama crime',
+                    # Misspelled, read again with the word corrected
+                    'godfater']
+
+# How deep into the list the later page is read, in pages
+DEEP_PAGE = 40
+
+def _after(row, sort_field):
+    # Keyset of a row, as MovieTableModel passes it for the next page
+    column = MOVIE_ROW_COLUMNS.index(sort_field) if sort_field else MOVIE_ROW_COLUMNS.index('id')
+    return row[column], row[MOVIE_ROW_COLUMNS.index('id')]
+
+def bench_movie_list(repository, user_id, repeat):
+    # The queries behind load_movies and scrolling, for every filter and sort
+    results = {}
+    sorts = [(None, None)] + list(SORT_OPTIONS.values())
+    for filter_name, filters in FILTERS.items():
+        for sort_field, sort_order in sorts:
+            name = f"movie_list/{filter_name}/{sort_field or 'unsorted'}"
+            if sort_field:
+                name += f" {sort_order}"
+            query = dict(filters, sort_field=sort_field, sort_order=sort_order)
+            results[f"{name}/first_page"] = timed(
+                lambda: repository.list_movies(user_id, limit=DEFAULT_PAGE_SIZE, **query), repeat)
+
+            rows = repository.list_movies(user_id, limit=DEFAULT_PAGE_SIZE * DEEP_PAGE, **query)
+            if len(rows) < DEFAULT_PAGE_SIZE * DEEP_PAGE:
+                continue
+            # Ranked search results page by offset, everything else by keyset
+            if query.get('search') and not sort_field:
+                page = {'offset': len(rows)}
+            else:
+                page = {'after': _after(rows[-1], sort_field)}
+            results[f"{name}/page_{DEEP_PAGE}"] = timed(
+                lambda: repository.list_movies(user_id, limit=DEFAULT_PAGE_SIZE, **query, **page),
+                repeat)
+    return results
+
+def bench_login(repository, repeat):
+    # Hashing included, as LoginWindow.login does it
+    return {
+        'login/success': timed(
+            lambda: repository.find_user('user1', password_hash(BENCHMARK_PASSWORD)), repeat),
+        'login/wrong_password': timed(
+            lambda: repository.find_user('user1', password_hash('wrong')), repeat),
+        'login/security_answer': timed(
+            lambda: repository.get_security_answer('user1'), repeat),
+    }
+
+def bench_edit_delete(repository, vocabulary, user_id, repeat):
+    # The lookups and writes behind the edit, delete and duplicate checks
+    movie_id = repository.list_movies(user_id, limit=1)[0][MOVIE_ROW_COLUMNS.index('id')]
+    movie = dict(zip(MOVIE_ROW_COLUMNS, repository.get_movie(user_id, movie_id)))
+    new_movies = (dict(zip(MOVIE_COLUMNS, row))
+                  for row in synthetic_movies(vocabulary, repeat + 1, seed=99))
+    added = []
+
+    def add():
+        added.append(repository.add_movie(user_id, next(new_movies)))
+
+    results = {
+        'edit/get_movie': timed(lambda: repository.get_movie(user_id, movie_id), repeat),
+        'edit/update_movie': timed(lambda: repository.update_movie(user_id, movie_id, movie),
+                                   repeat),
+        # As MainWindow checks a new movie against a list it has not matched before
+        'edit/find_duplicates': timed(
+            lambda: repository.library_matcher(user_id)[1].match(movie['movie_name'],
+                                                                 movie['published_year']),
+            repeat),
+        'edit/add_movie': timed(add, repeat),
+    }
+    results['edit/delete_movie'] = timed(lambda: repository.delete_movie(user_id, added.pop()),
+                                         len(added) - 1)
+    return results
+
+# A file with titles only, the rest is filled in from the catalog
+ENRICHED_MAPPING = {field: IMPORT_MAPPING[field]
+                    for field in ('movie_name', 'published_year', 'personal_rating')}
+
+def _timed_import(repository, user_id, path, mapping, catalog=None):
+    started = time.perf_counter()
+    result = import_file(repository, user_id, path, mapping, catalog=catalog)
+    elapsed = time.perf_counter() - started
+    stats = summarize([elapsed])
+    stats['rows'] = result.success_count
+    stats['rows_per_second'] = result.success_count / elapsed
+    if catalog is not None:
+        stats['catalog_matched'] = result.catalog_matched
+    undo_import(repository, result)
+    return stats
+
+def bench_imports(repository, vocabulary, catalog, work_dir, sizes, seed):
+    # Runs per size into a fresh user, removed again afterwards. Writing
+    # the source file is not timed.
+    results = {}
+    for size in sizes:
+        path = write_import_file(os.path.join(work_dir, f"import_{size}.csv"), vocabulary,
+                                 size, seed)
+        user_id = repository.register_user(f"import{size}_{time.time_ns()}", '', '', '')
+        results[f"import/csv_{size}"] = _timed_import(repository, user_id, path, IMPORT_MAPPING)
+        results[f"import/csv_{size}_enriched"] = _timed_import(
+            repository, user_id, path, ENRICHED_MAPPING, catalog)
+        os.remove(path)
+    return results
+
+def bench_catalog(repository, catalog_path, work_dir, user_id, repeat):
+    # A copy, so the snapshot is written next to it and not next to the real catalog
+    path = shutil.copy(catalog_path, os.path.join(work_dir, os.path.basename(catalog_path)))
+    results = {'catalog/parse_csv': timed(lambda: parse_catalog_csv(path), repeat)}
+
+    def cold_snapshot():
+        if os.path.exists(snapshot_path(path)):
+            os.remove(snapshot_path(path))
+        load_catalog_snapshot(path)
+
+    results['catalog/load_without_snapshot'] = timed(cold_snapshot, repeat)
+    results['catalog/load_snapshot'] = timed(lambda: load_catalog_snapshot(path), repeat)
+
+    def reload_table():
+        repository.execute('DELETE FROM catalog_sources')
+        repository.load_catalog(path)
+
+    # What the first start after the CSV changed adds, and every other start
+    results['catalog/load_table'] = timed(reload_table, repeat)
+    results['catalog/load_table_unchanged'] = timed(lambda: repository.load_catalog(path), repeat)
+
+    # The pages the IMDB window reads, with the "In My List" flag of every row
+    for sort_field in CATALOG_SORT_FIELDS:
+        for sort_order in ('ASC', 'DESC'):
+            query = {'sort_field': sort_field, 'sort_order': sort_order}
+            results[f"catalog/page/{sort_field} {sort_order}"] = timed(
+                lambda: repository.list_catalog(user_id, limit=DEFAULT_PAGE_SIZE, **query), repeat)
+    results['catalog/page/hide_listed'] = timed(
+        lambda: repository.list_catalog(user_id, limit=DEFAULT_PAGE_SIZE, hide_listed=True),
+        repeat)
+    results['catalog/page/filtered'] = timed(
+        lambda: repository.list_catalog(user_id, limit=DEFAULT_PAGE_SIZE, min_rating=8,
+                                        year_from=1990, year_to=1999), repeat)
+    for search in CATALOG_SEARCHES:
+        results[f"catalog/search/{search}"] = timed(
+            lambda: repository.list_catalog(user_id, limit=DEFAULT_PAGE_SIZE, search=search),
+            repeat)
+    return results
+
+def bench_recommend(repository, catalog_path, user_id, repeat):
+    # The feature matrix is built once per catalog, recommend is what every
+    # refresh of the window runs
+    from recommend import build_feature_matrix, recommend
+
+    catalog = load_catalog_snapshot(catalog_path)
+    library = repository.get_movie_profiles(user_id)
+    results = {
+        'recommend/build_feature_matrix': timed(lambda: build_feature_matrix(catalog), repeat),
+        'recommend/movie_profiles': timed(lambda: repository.get_movie_profiles(user_id), repeat),
+    }
+    results['recommend/recommend'] = timed(lambda: recommend(catalog, library), repeat)
+    return results
+
+def bench_imdb_dump(repository, vocabulary, work_dir, user_id, titles, repeat, seed):
+    # One ingestion of generated dump files, then the IMDB window's pages
+    # against a catalog of that size. Writing the files is not timed.
+    from imdb_dump import ingest_dump
+
+    directory = os.path.join(work_dir, 'imdb_dump')
+    os.makedirs(directory, exist_ok=True)
+    write_imdb_dump(directory, vocabulary, titles, seed)
+    started = time.perf_counter()
+    rows = ingest_dump(repository, directory)
+    elapsed = time.perf_counter() - started
+    stats = summarize([elapsed])
+    stats['rows'] = rows['title.basics']
+    stats['rows_per_second'] = rows['title.basics'] / elapsed
+    results = {f"imdb_dump/ingest_{titles}": stats}
+
+    for sort_field in CATALOG_SORT_FIELDS:
+        query = {'sort_field': sort_field, 'sort_order': 'DESC'}
+        results[f"imdb_dump/page/{sort_field} DESC"] = timed(
+            lambda: repository.list_catalog(user_id, limit=DEFAULT_PAGE_SIZE, **query), repeat)
+    results['imdb_dump/page/hide_listed'] = timed(
+        lambda: repository.list_catalog(user_id, limit=DEFAULT_PAGE_SIZE, hide_listed=True),
+        repeat)
+    for search in CATALOG_SEARCHES:
+        results[f"imdb_dump/search/{search}"] = timed(
+            lambda: repository.list_catalog(user_id, limit=DEFAULT_PAGE_SIZE, search=search),
+            repeat)
+    shutil.rmtree(directory)
+    return results
+
+def run(database_path, vocabulary, user_id, catalog_path, work_dir, repeat=5,
+        import_sizes=(), seed=0, dump_titles=0):
+    repository = MovieRepository(database_path)
+    try:
+        # Opened the way the app opens it, migrations and PRAGMA optimize included
+        repository.setup()
+        results = {}
+        results.update(bench_login(repository, repeat))
+        results.update(bench_movie_list(repository, user_id, repeat))
+        results.update(bench_edit_delete(repository, vocabulary, user_id, repeat))
+        results.update(bench_catalog(repository, catalog_path, work_dir, user_id, repeat))
+        # The copy bench_catalog left in work_dir, with its snapshot
+        catalog_copy = os.path.join(work_dir, os.path.basename(catalog_path))
+        results.update(bench_recommend(repository, catalog_copy, user_id, repeat))
+        results.update(bench_imports(repository, vocabulary, load_catalog_snapshot(catalog_copy),
+                                     work_dir, import_sizes, seed))
+        # Last, the dump replaces the catalog the benchmarks above read
+        if dump_titles:
+            results.update(bench_imdb_dump(repository, vocabulary, work_dir, user_id,
+                                           dump_titles, repeat, seed))
+    finally:
+        repository.close()
+    return results
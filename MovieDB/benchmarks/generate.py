@@ -0,0 +1,169 @@
+import os
+import csv
+import gzip
+import random
+import hashlib
+from datetime import date, timedelta
+
+from catalog import parse_catalog_csv
+from database import MOVIE_COLUMNS, MovieRepository, bulk_load
+
+# Same password hashing as the login window
+BENCHMARK_PASSWORD = 'benchmark'
+GENERATE_CHUNK_SIZE = 10000
+
+# Variations so that large libraries are not the catalog titles repeated
+TITLE_SUFFIXES = ['', '', '', '', ' II', ' III', ': Part Two', ' Returns', " (Director's Cut)"]
+NOTES = ['', '', '', '', 'Rewatch', 'Watched with friends', 'Cinema', 'Fell asleep',
+         'Recommended by a friend', 'Favourite']
+
+# Column names of the generated import files, ImportDialog maps them back
+IMPORT_HEADERS = ['Title', 'Year', 'Genre', 'Director', 'Actors', 'IMDb Rating', 'My Rating',
+                  'Watched On', 'Notes']
+IMPORT_MAPPING = dict(zip(MOVIE_COLUMNS, IMPORT_HEADERS))
+
+def password_hash(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+class Vocabulary:
+    # Titles, genre combinations, people, years and ratings drawn from the
+    # IMDB catalog, so the generated rows share its distributions
+    def __init__(self, catalog_path):
+        catalog = parse_catalog_csv(catalog_path)
+        self.rows = list(range(len(catalog)))
+        self.title = catalog.title
+        self.year = catalog.year
+        self.genre = catalog.genre
+        self.director = catalog.director
+        self.stars = catalog.stars
+        self.imdb_rating = catalog.imdb_rating
+        self.actors = sorted({star for stars in catalog.stars for star in stars})
+
+def synthetic_movies(vocabulary, count, seed=0):
+    # Rows in MOVIE_COLUMNS order
+    rng = random.Random(seed)
+    today = date(2025, 12, 31)
+    for _ in range(count):
+        row = rng.choice(vocabulary.rows)
+        year = vocabulary.year[row]
+        stars = list(vocabulary.stars[row])
+        # Mostly the film's own cast, sometimes someone from another film
+        if stars and rng.random() < 0.3:
+            stars[rng.randrange(len(stars))] = rng.choice(vocabulary.actors)
+        watch_date = None
+        if rng.random() < 0.9:
+            first = date(max(year or 1990, 1990), 1, 1)
+            watch_date = (first + timedelta(days=rng.randrange((today - first).days + 1))
+                          ).isoformat()
+        yield (
+            vocabulary.title[row] + rng.choice(TITLE_SUFFIXES),
+            year,
+            vocabulary.genre[row],
+            vocabulary.director[row],
+            ', '.join(stars),
+            vocabulary.imdb_rating[row],
+            round(rng.uniform(1, 10), 1) if rng.random() < 0.85 else None,
+            watch_date,
+            rng.choice(NOTES),
+        )
+
+def generate_library(path, vocabulary, users, movies_per_user, seed=0):
+    # A fresh database at path with users named user1..userN, each with
+    # movies_per_user movies. Returns the user ids.
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    repository = MovieRepository(path)
+    repository.setup()
+    insert_sql = (f"INSERT INTO movies ({', '.join(MOVIE_COLUMNS + ['user_id'])}) "
+                  f"VALUES ({', '.join('?' * (len(MOVIE_COLUMNS) + 1))})")
+    user_ids = []
+    try:
+        for number in range(1, users + 1):
+            user_id = repository.register_user(f"user{number}", password_hash(BENCHMARK_PASSWORD),
+                                               "Benchmark", "benchmark")
+            user_ids.append(user_id)
+            movies = synthetic_movies(vocabulary, movies_per_user, seed + number)
+            while True:
+                rows = [movie + (user_id,) for _, movie in zip(range(GENERATE_CHUNK_SIZE), movies)]
+                if not rows:
+                    break
+                with repository.transaction(immediate=True) as conn:
+                    with bulk_load(conn):
+                        conn.executemany(insert_sql, rows)
+    finally:
+        repository.close()
+    return user_ids
+
+def write_import_file(path, vocabulary, count, seed=0):
+    # A CSV as a user would export it from another app, imported with IMPORT_MAPPING
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(IMPORT_HEADERS)
+        writer.writerows(synthetic_movies(vocabulary, count, seed))
+    return path
+
+def write_catalog_file(source_path, path, count):
+    # The IMDB catalog grown to count rows in its own CSV format. Copies after
+    # the first round get a number after the title, "The Godfather 2".
+    with open(source_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+    title = header.index('Series_Title')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for number in range(count):
+            row = list(rows[number % len(rows)])
+            if number >= len(rows):
+                row[title] = f"{row[title]} {number // len(rows) + 1}"
+            writer.writerow(row)
+    return path
+
+# Share of the generated dump titles that are episodes, which are not ingested
+DUMP_EPISODE_SHARE = 0.3
+
+def _write_tsv(path, header, rows):
+    with gzip.open(path, 'wt', compresslevel=1, encoding='utf-8', newline='') as f:
+        f.write('\t'.join(header) + '\n')
+        for row in rows:
+            f.write('\t'.join('\\N' if value is None else str(value) for value in row) + '\n')
+
+def write_imdb_dump(directory, vocabulary, titles, seed=0):
+    # title.basics, title.ratings, title.principals and name.basics .tsv.gz
+    # files in the IMDb dataset format, for titles titles drawn from the catalog
+    rng = random.Random(seed)
+    rows = [rng.choice(vocabulary.rows) for _ in range(titles)]
+    people = sorted({name for row in vocabulary.rows
+                     for name in (vocabulary.director[row],) + tuple(vocabulary.stars[row])})
+    nconst = {name: f"nm{number:07d}" for number, name in enumerate(people, start=1)}
+
+    def tconst(number):
+        return f"tt{number:07d}"
+
+    _write_tsv(os.path.join(directory, 'title.basics.tsv.gz'),
+               ['tconst', 'titleType', 'primaryTitle', 'originalTitle', 'isAdult', 'startYear',
+                'endYear', 'runtimeMinutes', 'genres'],
+               ((tconst(number),
+                 'tvEpisode' if rng.random() < DUMP_EPISODE_SHARE else 'movie',
+                 vocabulary.title[row] + rng.choice(TITLE_SUFFIXES),
+                 vocabulary.title[row], 0, vocabulary.year[row], None,
+                 rng.randrange(80, 200), vocabulary.genre[row].replace(', ', ',') or None)
+                for number, row in enumerate(rows, start=1)))
+    _write_tsv(os.path.join(directory, 'title.ratings.tsv.gz'),
+               ['tconst', 'averageRating', 'numVotes'],
+               ((tconst(number), round(rng.uniform(1, 10), 1), rng.randrange(5, 3000000))
+                for number in range(1, titles + 1) if rng.random() < 0.9))
+    _write_tsv(os.path.join(directory, 'title.principals.tsv.gz'),
+               ['tconst', 'ordering', 'nconst', 'category', 'job', 'characters'],
+               ((tconst(number), ordering, nconst[name], category, None, None)
+                for number, row in enumerate(rows, start=1)
+                for ordering, (category, name) in enumerate(
+                    [('director', vocabulary.director[row])]
+                    + [('actor', star) for star in vocabulary.stars[row]], start=1)))
+    _write_tsv(os.path.join(directory, 'name.basics.tsv.gz'),
+               ['nconst', 'primaryName', 'birthYear', 'deathYear', 'primaryProfession',
+                'knownForTitles'],
+               ((nconst[name], name, None, None, None, None) for name in people))
+    return directory
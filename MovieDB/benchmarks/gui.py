@@ -0,0 +1,193 @@
+import os
+import time
+
+# Must be set before Qt loads its platform plugin
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import QEvent, QObject
+from PyQt6.QtTest import QTest
+from PyQt6.QtWidgets import QApplication
+
+from .timing import summarize
+
+# (MainWindow line edit, text typed into it one key at a time)
+MAIN_WINDOW_TYPING = [
+    ('search_input', 'godfather'),
+    ('genre_filter', 'Drama, Crime'),
+    ('actor_filter', 'Tom Hanks'),
+]
+IMDB_TYPING = ['godfather', 'nolan', 'tom hanks', 'shawshank']
+
+# Seconds a single step may take before the benchmark gives up
+SETTLE_TIMEOUT = 60.0
+
+class PaintProbe(QObject):
+    # Counts the paints of a table's viewport that happened after its model
+    # last reset, so a step is only done once its new rows are on screen
+    def __init__(self, table):
+        super().__init__(table)
+        self.paints = 0
+        self.stale = False
+        table.viewport().installEventFilter(self)
+        table.model().modelReset.connect(self.model_reset)
+
+    def model_reset(self):
+        self.stale = True
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.Paint:
+            self.paints += 1
+            self.stale = False
+        return False
+
+def wait_until(app, condition, timeout=SETTLE_TIMEOUT):
+    # Runs the event loop until condition holds and returns that moment. The
+    # paint itself happens inside processEvents, so it is included.
+    deadline = time.perf_counter() + timeout
+    while True:
+        app.processEvents()
+        now = time.perf_counter()
+        if condition():
+            return now
+        if now > deadline:
+            raise RuntimeError("The window did not settle in time")
+        # Lets the query worker thread take the GIL
+        time.sleep(0.0005)
+
+def _close(app, window):
+    # hide() instead of close(), MainWindow asks before closing
+    window.hide()
+    window.deleteLater()
+    app.processEvents()
+
+def open_main_window(app, user_id):
+    # Seconds from constructing the window to its first painted rows
+    from main import MainWindow
+
+    started = time.perf_counter()
+    window = MainWindow(user_id)
+    probe = PaintProbe(window.movie_table)
+    window.show()
+    painted = wait_until(app, lambda: probe.paints > 0)
+    return window, probe, painted - started
+
+def open_imdb_window(app, parent):
+    from main import IMDBTop1000Window
+
+    started = time.perf_counter()
+    window = IMDBTop1000Window(parent.user_id, parent)
+    window.show()
+    probe = PaintProbe(window.movie_table)
+    painted = wait_until(app, lambda: probe.paints > 0)
+    return window, probe, painted - started
+
+def _main_window_settled(window, probe, paints):
+    return (not window.filter_timer.isActive() and not window.movie_model.is_loading()
+            and not probe.stale and probe.paints > paints)
+
+def bench_main_window(app, user_id, repeat):
+    results = {}
+    samples = []
+    for _ in range(repeat):
+        window, _, seconds = open_main_window(app, user_id)
+        samples.append(seconds)
+        _close(app, window)
+    results['main_window/first_paint'] = summarize(samples)
+
+    window, probe, _ = open_main_window(app, user_id)
+    fired = []
+    # Connected after apply_filters, which only starts the query worker
+    window.filter_timer.timeout.connect(lambda: fired.append(time.perf_counter()))
+    for attribute, text in MAIN_WINDOW_TYPING:
+        line_edit = getattr(window, attribute)
+        # Time the key event takes on the GUI thread, and from the end of the
+        # debounce to the new rows being painted
+        keystrokes = []
+        updates = []
+        for _ in range(repeat):
+            if line_edit.text():
+                paints = probe.paints
+                line_edit.clear()
+                wait_until(app, lambda: _main_window_settled(window, probe, paints))
+            for char in text:
+                paints = probe.paints
+                started = time.perf_counter()
+                QTest.keyClicks(line_edit, char)
+                keystrokes.append(time.perf_counter() - started)
+                painted = wait_until(app, lambda: _main_window_settled(window, probe, paints))
+                updates.append(painted - fired[-1])
+        line_edit.clear()
+        results[f"main_window/keystroke/{attribute}"] = summarize(keystrokes)
+        results[f"main_window/update/{attribute}"] = summarize(updates)
+    wait_until(app, lambda: not window.filter_timer.isActive()
+               and not window.movie_model.is_loading())
+
+    # Every sort option in turn, each from the option before it
+    combo = window.sort_combo
+    sorts = {}
+    for _ in range(repeat):
+        for index in range(1, combo.count()):
+            paints = probe.paints
+            started = time.perf_counter()
+            combo.setCurrentIndex(index)
+            painted = wait_until(app, lambda: _main_window_settled(window, probe, paints))
+            sorts.setdefault(combo.itemText(index), []).append(painted - started)
+    for label, samples in sorts.items():
+        results[f"main_window/sort/{label}"] = summarize(samples)
+    return window, results
+
+def _imdb_window_settled(window, probe, paints):
+    return (not window.filter_timer.isActive() and not window.catalog_model.is_loading()
+            and not probe.stale and probe.paints > paints)
+
+def bench_imdb_window(app, parent, repeat):
+    results = {}
+    # The first open in the process fills the catalog table from the CSV
+    # and prepares the catalog queries
+    window, _, seconds = open_imdb_window(app, parent)
+    results['imdb_window/first_paint_cold'] = summarize([seconds])
+    _close(app, window)
+    samples = []
+    for _ in range(repeat):
+        window, _, seconds = open_imdb_window(app, parent)
+        samples.append(seconds)
+        _close(app, window)
+    results['imdb_window/first_paint'] = summarize(samples)
+
+    window, probe, _ = open_imdb_window(app, parent)
+    fired = []
+    window.filter_timer.timeout.connect(lambda: fired.append(time.perf_counter()))
+    # As in the main window, the key event only restarts the debounce and the
+    # query runs on a worker thread once it fires
+    keystrokes = []
+    updates = []
+    for _ in range(repeat):
+        for text in IMDB_TYPING:
+            if window.search_input.text():
+                paints = probe.paints
+                window.search_input.clear()
+                wait_until(app, lambda: _imdb_window_settled(window, probe, paints))
+            for char in text:
+                paints = probe.paints
+                started = time.perf_counter()
+                QTest.keyClicks(window.search_input, char)
+                keystrokes.append(time.perf_counter() - started)
+                painted = wait_until(app, lambda: _imdb_window_settled(window, probe, paints))
+                updates.append(painted - fired[-1])
+    results['imdb_window/keystroke'] = summarize(keystrokes)
+    results['imdb_window/update'] = summarize(updates)
+    _close(app, window)
+    return results
+
+def run(work_dir, user_id, repeat=5):
+    # The windows find moviedb.sqlite and imdb_top_1000.csv in the working
+    # directory, as they do when the app is started
+    os.chdir(work_dir)
+    # As the app starts
+    from main import setup_database
+    setup_database()
+    app = QApplication.instance() or QApplication([])
+    main_window, results = bench_main_window(app, user_id, repeat)
+    results.update(bench_imdb_window(app, main_window, repeat))
+    _close(app, main_window)
+    return results
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import platform
+import statistics
+
+def percentile(samples, fraction):
+    # Nearest-rank percentile of a non-empty list
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def summarize(samples):
+    # Durations in seconds to the stats stored per benchmark, in milliseconds
+    return {
+        'runs': len(samples),
+        'min_ms': min(samples) * 1000,
+        'median_ms': statistics.median(samples) * 1000,
+        'p90_ms': percentile(samples, 0.90) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'max_ms': max(samples) * 1000,
+    }
+
+def timed(func, repeat=5, warmup=1):
+    # Stats for repeat calls of func, after warmup calls that fill the caches
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def write_results(path, suite, settings, results):
+    # One JSON file per run, compared with compare_results later
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'suite': suite,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'environment': environment(),
+            'settings': settings,
+            'results': results,
+        }, f, indent=2)
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def compare_results(baseline, current, threshold=0.10, min_change_ms=0.1):
+    # Lines comparing the median of every benchmark both runs have, and the
+    # names of the ones more than threshold slower than the baseline. Changes
+    # under min_change_ms are timer noise on the sub-millisecond lookups.
+    lines = [f"{'benchmark':<60} {'baseline':>10} {'current':>10} {'change':>8}"]
+    regressions = []
+    for name, stats in current['results'].items():
+        old = baseline['results'].get(name)
+        if not old or not old.get('median_ms'):
+            continue
+        change = stats['median_ms'] / old['median_ms'] - 1
+        marker = ''
+        if change > threshold and stats['median_ms'] - old['median_ms'] > min_change_ms:
+            regressions.append(name)
+            marker = ' !'
+        lines.append(f"{name:<60} {old['median_ms']:>8.2f}ms {stats['median_ms']:>8.2f}ms "
+                     f"{change:>+7.1%}{marker}")
+    return lines, regressions
+
+def print_results(results, file=sys.stdout):
+    for name, stats in results.items():
+        extra = ''.join(f"  {key}={value:,.0f}" for key, value in stats.items()
+                        if not key.endswith('_ms') and key != 'runs')
+        print(f"{name:<60} median {stats['median_ms']:>9.2f}ms  p95 {stats['p95_ms']:>9.2f}ms"
+              f"{extra}", file=file)
@@ -0,0 +1,175 @@
+import os
+import pickle
+import hashlib
+import threading
+
+from search import TitleMatcher
+
+CATALOG_PATH = 'imdb_top_1000.csv'
+SNAPSHOT_VERSION = 1
+
+# Columns kept in the snapshot, all plain Python lists of equal length
+CATALOG_COLUMNS = [
+    'title', 'year', 'certificate', 'runtime', 'genre', 'imdb_rating',
+    'overview', 'meta_score', 'director', 'stars', 'votes', 'gross'
+]
+
+class Catalog:
+    def __init__(self, columns):
+        self.columns = columns
+        for name in CATALOG_COLUMNS:
+            setattr(self, name, columns[name])
+        self._title_matcher = None
+        self._enrichment_frame = None
+        self._feature_matrix = None
+
+    def __len__(self):
+        return len(self.title)
+
+    def actors(self, row):
+        return ', '.join(self.stars[row])
+
+    def row(self, row):
+        return {name: self.columns[name][row] for name in CATALOG_COLUMNS}
+
+    def movie_data(self, row, note=""):
+        # The catalog row as fields of a movie in the user's list
+        return {
+            'movie_name': self.title[row],
+            'published_year': self.year[row] or 0,
+            'genre': self.genre[row],
+            'director': self.director[row],
+            'actors': self.actors(row),
+            'imdb_rating': self.imdb_rating[row] or 0,
+            'personal_rating': 0,
+            'note': note
+        }
+
+    def title_matcher(self):
+        # Links free-text titles to catalog rows, a match's entry is its row
+        if self._title_matcher is None:
+            self._title_matcher = TitleMatcher(self.title, self.year)
+        return self._title_matcher
+
+    def feature_matrix(self):
+        # Built on first use and kept with the catalog, which get_catalog
+        # replaces when the file changes. numpy is only imported here.
+        if self._feature_matrix is None:
+            from recommend import build_feature_matrix
+            self._feature_matrix = build_feature_matrix(self)
+        return self._feature_matrix
+
+    def enrichment_frame(self):
+        # What an import may fill in, by title key, as a pandas frame with
+        # the movie field names. Built on first use.
+        if self._enrichment_frame is None:
+            import pandas as pd
+
+            self._enrichment_frame = pd.DataFrame({
+                'title_key': self.title_matcher().keys,
+                'published_year': pd.to_numeric(pd.Series(self.year, dtype=object)),
+                'genre': self.genre,
+                'director': self.director,
+                'actors': [self.actors(row) for row in range(len(self))],
+                'imdb_rating': pd.to_numeric(pd.Series(self.imdb_rating, dtype=object)),
+            })
+        return self._enrichment_frame
+
+def snapshot_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.snapshot.pkl'
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _nullable(series, cast):
+    # pandas missing values become None so the snapshot holds plain Python types
+    missing = series.isna().tolist()
+    return [None if is_missing else cast(value)
+            for value, is_missing in zip(series.tolist(), missing)]
+
+def parse_catalog_csv(path):
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    stars = df[['Star1', 'Star2', 'Star3', 'Star4']].fillna('').astype(str)
+    columns = {
+        'title': df['Series_Title'].astype(str).tolist(),
+        # Rows with a certificate in Released_Year (Apollo 13) get no year
+        'year': _nullable(pd.to_numeric(df['Released_Year'], errors='coerce'), int),
+        'certificate': _nullable(df['Certificate'], str),
+        'runtime': _nullable(pd.to_numeric(df['Runtime'].astype(str).str.extract(r'(\d+)')[0],
+                                           errors='coerce'), int),
+        'genre': df['Genre'].fillna('').astype(str).tolist(),
+        'imdb_rating': _nullable(pd.to_numeric(df['IMDB_Rating'], errors='coerce'), float),
+        'overview': df['Overview'].fillna('').astype(str).tolist(),
+        'meta_score': _nullable(pd.to_numeric(df['Meta_score'], errors='coerce'), float),
+        'director': df['Director'].fillna('').astype(str).tolist(),
+        'stars': [tuple(star for star in row if star) for row in stars.itertuples(index=False)],
+        'votes': _nullable(pd.to_numeric(df['No_of_Votes'], errors='coerce'), int),
+        'gross': _nullable(pd.to_numeric(df['Gross'].astype(str).str.replace(',', ''),
+                                         errors='coerce'), int),
+    }
+    return Catalog(columns)
+
+def _read_snapshot(path):
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+def _write_snapshot(path, snapshot):
+    # Write to a temporary file first so a crash never leaves a torn snapshot
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+def load_catalog_snapshot(csv_path):
+    stat = os.stat(csv_path)
+    path = snapshot_path(csv_path)
+    snapshot = _read_snapshot(path)
+
+    if snapshot and snapshot['mtime_ns'] == stat.st_mtime_ns and snapshot['size'] == stat.st_size:
+        return Catalog(snapshot['columns'])
+
+    # The file was touched, only reparse when its contents really changed
+    digest = file_hash(csv_path)
+    if snapshot and snapshot['sha256'] == digest:
+        catalog = Catalog(snapshot['columns'])
+    else:
+        catalog = parse_catalog_csv(csv_path)
+
+    _write_snapshot(path, {
+        'version': SNAPSHOT_VERSION,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': digest,
+        'columns': catalog.columns,
+    })
+    return catalog
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def get_catalog(csv_path=CATALOG_PATH):
+    # Kept for the life of the process, revalidated against the file's mtime
+    stat = os.stat(csv_path)
+    key = os.path.abspath(csv_path)
+    with _catalogs_lock:
+        cached = _catalogs.get(key)
+        if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            return cached[1]
+        catalog = load_catalog_snapshot(csv_path)
+        _catalogs[key] = ((stat.st_mtime_ns, stat.st_size), catalog)
+        return catalog
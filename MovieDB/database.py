@@ -0,0 +1,1101 @@
+import os
+import json
+import sqlite3
+import threading
+import queue
+from contextlib import contextmanager
+
+from querylog import TracedConnection, get_query_log
+from catalog import CATALOG_COLUMNS, file_hash, load_catalog_snapshot
+from search import YEAR_TOLERANCE, TitleMatcher, similar_terms, tokenize
+
+DATABASE_PATH = 'moviedb.sqlite'
+
+# Pragmas applied to every pooled connection
+CONNECTION_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA foreign_keys=ON',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=134217728',
+]
+
+MOVIE_COLUMNS = [
+    'movie_name', 'published_year', 'genre', 'director',
+    'actors', 'imdb_rating', 'personal_rating', 'watch_date', 'note'
+]
+
+# Sort combo box index -> (ORDER BY expression, direction)
+SORT_OPTIONS = {
+    1: ("movie_name", "ASC"),  # Name (A-Z)
+    2: ("movie_name", "DESC"),  # Name (Z-A)
+    3: ("published_year", "DESC"),  # Year (Newest)
+    4: ("published_year", "ASC"),  # Year (Oldest)
+    5: ("imdb_rating", "DESC"),  # IMDB Rating (High-Low)
+    6: ("imdb_rating", "ASC"),  # IMDB Rating (Low-High)
+    7: ("personal_rating", "DESC"),  # Personal Rating (High-Low)
+    8: ("personal_rating", "ASC"),  # Personal Rating (Low-High)
+    9: ("watch_day", "DESC"),  # Watch Date (Newest)
+    10: ("watch_day", "ASC")  # Watch Date (Oldest)
+}
+
+# Julian day number of a YYYY-MM-DD watch date, NULL for anything else. The
+# GLOB keeps values like 'now' away from julianday, which must be deterministic
+# in a generated column.
+WATCH_DAY_EXPRESSION = (
+    "CASE WHEN watch_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' "
+    "THEN CAST(julianday(watch_date) AS INTEGER) END"
+)
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Never edit a released migration, append a new one instead.
+MIGRATIONS = [
+    # 1: indexes for the per-user lookups and every sort option
+    [
+        'CREATE INDEX IF NOT EXISTS idx_movies_user_name ON movies (user_id, movie_name)',
+        'CREATE INDEX IF NOT EXISTS idx_movies_user_year ON movies (user_id, published_year)',
+        'CREATE INDEX IF NOT EXISTS idx_movies_user_imdb_rating ON movies (user_id, imdb_rating)',
+        'CREATE INDEX IF NOT EXISTS idx_movies_user_personal_rating ON movies (user_id, personal_rating)',
+        'CREATE INDEX IF NOT EXISTS idx_movies_user_watch_date ON movies (user_id, watch_date)',
+    ],
+    # 2: insertion-ordered paging of the unsorted library
+    [
+        'CREATE INDEX IF NOT EXISTS idx_movies_user ON movies (user_id)',
+    ],
+    # 3: full-text search over the library, kept in sync by triggers
+    [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+            movie_name, director, actors, genre, note,
+            content='movies', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS movies_fts_insert AFTER INSERT ON movies BEGIN
+            INSERT INTO movies_fts (rowid, movie_name, director, actors, genre, note)
+            VALUES (new.id, new.movie_name, new.director, new.actors, new.genre, new.note);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS movies_fts_delete AFTER DELETE ON movies BEGIN
+            INSERT INTO movies_fts (movies_fts, rowid, movie_name, director, actors, genre, note)
+            VALUES ('delete', old.id, old.movie_name, old.director, old.actors, old.genre, old.note);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS movies_fts_update AFTER UPDATE ON movies BEGIN
+            INSERT INTO movies_fts (movies_fts, rowid, movie_name, director, actors, genre, note)
+            VALUES ('delete', old.id, old.movie_name, old.director, old.actors, old.genre, old.note);
+            INSERT INTO movies_fts (rowid, movie_name, director, actors, genre, note)
+            VALUES (new.id, new.movie_name, new.director, new.actors, new.genre, new.note);
+        END
+        ''',
+        "INSERT INTO movies_fts (movies_fts) VALUES ('rebuild')",
+    ],
+    # 4: genres and actors as lookup tables for indexed facet filters
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS genres (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS people (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS movie_genres (
+            movie_id INTEGER NOT NULL REFERENCES movies (id),
+            genre_id INTEGER NOT NULL REFERENCES genres (id),
+            PRIMARY KEY (movie_id, genre_id)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS movie_actors (
+            movie_id INTEGER NOT NULL REFERENCES movies (id),
+            person_id INTEGER NOT NULL REFERENCES people (id),
+            position INTEGER NOT NULL,
+            PRIMARY KEY (movie_id, person_id)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_movie_genres_genre ON movie_genres (genre_id, movie_id)',
+        'CREATE INDEX IF NOT EXISTS idx_movie_actors_person ON movie_actors (person_id, movie_id)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS movies_links_delete AFTER DELETE ON movies BEGIN
+            DELETE FROM movie_genres WHERE movie_id = old.id;
+            DELETE FROM movie_actors WHERE movie_id = old.id;
+        END
+        ''',
+        lambda conn: link_movies(conn, [row[0] for row in conn.execute('SELECT id FROM movies')]),
+    ],
+    # 5: let bulk imports index full-text search per chunk instead of per row
+    [
+        'CREATE TABLE IF NOT EXISTS movies_bulk_load (active INTEGER)',
+        'DROP TRIGGER IF EXISTS movies_fts_insert',
+        '''
+        CREATE TRIGGER movies_fts_insert AFTER INSERT ON movies
+        WHEN NOT EXISTS (SELECT 1 FROM movies_bulk_load) BEGIN
+            INSERT INTO movies_fts (rowid, movie_name, director, actors, genre, note)
+            VALUES (new.id, new.movie_name, new.director, new.actors, new.genre, new.note);
+        END
+        ''',
+    ],
+    # 6: watch dates as an indexed day number, so sorting by them needs no
+    # per-row expression. Dates that never parsed were stored as ''.
+    [
+        f'''
+        ALTER TABLE movies ADD COLUMN watch_day INTEGER
+        GENERATED ALWAYS AS ({WATCH_DAY_EXPRESSION}) VIRTUAL
+        ''',
+        'DROP INDEX IF EXISTS idx_movies_user_watch_date',
+        'CREATE INDEX IF NOT EXISTS idx_movies_user_watch_day ON movies (user_id, watch_day)',
+        "UPDATE movies SET watch_date = NULL WHERE watch_date = ''",
+    ],
+    # 7: OCR text of imported images, keyed by a hash of the image contents
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS ocr_cache (
+            content_hash TEXT PRIMARY KEY,
+            text TEXT NOT NULL
+        ) WITHOUT ROWID
+        ''',
+    ],
+    # 8: the IMDB catalog as a table, so the catalog window can page, sort and
+    # filter it in SQL and join it with the user's list
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS catalog (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL COLLATE NOCASE,
+            year INTEGER,
+            certificate TEXT,
+            runtime INTEGER,
+            genre TEXT,
+            imdb_rating REAL,
+            overview TEXT,
+            meta_score REAL,
+            director TEXT COLLATE NOCASE,
+            stars TEXT,
+            votes INTEGER,
+            gross INTEGER
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_catalog_title ON catalog (title)',
+        'CREATE INDEX IF NOT EXISTS idx_catalog_year ON catalog (year)',
+        'CREATE INDEX IF NOT EXISTS idx_catalog_imdb_rating ON catalog (imdb_rating)',
+        'CREATE INDEX IF NOT EXISTS idx_catalog_director ON catalog (director)',
+        'CREATE INDEX IF NOT EXISTS idx_catalog_votes ON catalog (votes)',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5(
+            title, director, stars, genre, overview,
+            content='catalog', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        # The file the catalog table was loaded from, to reload it when it changes
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_sources (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            sha256 TEXT NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        # "In my list" looks a catalog title up among the user's movies
+        '''
+        CREATE INDEX IF NOT EXISTS idx_movies_user_title
+        ON movies (user_id, movie_name COLLATE NOCASE)
+        ''',
+    ],
+    # 9: titles from the IMDb dataset dumps, keyed by their tconst. Their
+    # directors and actors are kept by nconst until the names are read, and
+    # every ingestion step records how far into its file it got.
+    [
+        'ALTER TABLE catalog ADD COLUMN tconst TEXT',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_catalog_tconst ON catalog (tconst)',
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_principals (
+            catalog_id INTEGER NOT NULL REFERENCES catalog (id),
+            ordering INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            nconst TEXT NOT NULL,
+            PRIMARY KEY (catalog_id, ordering)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_catalog_principals_nconst ON catalog_principals (nconst)',
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_names (
+            nconst TEXT PRIMARY KEY,
+            name TEXT NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_ingest (
+            step TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            done INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+    ],
+    # 10: the words of catalog_fts, which misspelled search words are
+    # corrected against
+    [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_vocab USING fts5vocab(catalog_fts, 'row')",
+    ],
+    # 11: the words of actor names, so the actor filter finds "Tom Hanks" by
+    # "hanks" as well as by "tom"
+    [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS people_fts USING fts5(
+            name,
+            content='people', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS people_fts_insert AFTER INSERT ON people BEGIN
+            INSERT INTO people_fts (rowid, name) VALUES (new.id, new.name);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS people_fts_delete AFTER DELETE ON people BEGIN
+            INSERT INTO people_fts (people_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS people_fts_update AFTER UPDATE ON people BEGIN
+            INSERT INTO people_fts (people_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO people_fts (rowid, name) VALUES (new.id, new.name);
+        END
+        ''',
+        "INSERT INTO people_fts (people_fts) VALUES ('rebuild')",
+    ],
+]
+
+# bm25 column weights for movies_fts: name, director, actors, genre, note
+FTS_RANK = 'bm25(movies_fts, 10.0, 4.0, 4.0, 2.0, 1.0)'
+
+def split_names(text):
+    # "Drama, Crime, drama" -> ["Drama", "Crime"], the format the genre and
+    # actors columns are written in
+    names = []
+    seen = set()
+    for name in str(text or '').split(','):
+        name = name.strip()
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+def facet_terms(text):
+    # "a, b" must match both, "a | b" either one
+    text = str(text or '')
+    if '|' in text:
+        return [term.strip() for term in text.split('|') if term.strip()], 'OR'
+    return split_names(text), 'AND'
+
+def facet_filter(text, link_table, name_table, link_column, name_index=None):
+    # movies.id IN (...) clauses over the link tables. Names are matched by
+    # prefix as a range on the NOCASE unique index, or, with name_index, the
+    # FTS table of the names, by the words they contain. CROSS JOIN keeps the
+    # name lookup as the outer loop
+    terms, mode = facet_terms(text)
+    if name_index:
+        terms = [match for match in map(fts_query, terms) if match]
+    if not terms:
+        return '', []
+    subquery = (f"movies.id IN (SELECT {link_table}.movie_id FROM {name_table} "
+                f"CROSS JOIN {link_table} ON {link_table}.{link_column} = {name_table}.id "
+                f"WHERE {{}})")
+    params = []
+    if name_index:
+        prefix = f"{name_table}.id IN (SELECT rowid FROM {name_index} WHERE {name_index} MATCH ?)"
+        params += terms
+    else:
+        prefix = f"({name_table}.name >= ? AND {name_table}.name < ?)"
+        for term in terms:
+            params += [term, term + '\uffff']
+    if mode == 'OR':
+        return ' AND ' + subquery.format(' OR '.join([prefix] * len(terms))), params
+    return ''.join(' AND ' + subquery.format(prefix) for _ in terms), params
+
+# The comma-separated genre/actors column of each movie as a JSON array, so
+# the names can be split in SQL with json_each
+SPLIT_NAMES = "json_each('[' || replace(json_quote(movies.{column}), ',', '\",\"') || ']')"
+
+LINK_STATEMENTS = [
+    'DELETE FROM movie_genres WHERE movie_id IN (SELECT value FROM json_each(:ids))',
+    'DELETE FROM movie_actors WHERE movie_id IN (SELECT value FROM json_each(:ids))',
+    f'''
+    INSERT OR IGNORE INTO genres (name)
+    SELECT trim(names.value) FROM movies, {SPLIT_NAMES.format(column='genre')} AS names
+    WHERE movies.id IN (SELECT value FROM json_each(:ids)) AND trim(names.value) != ''
+    ''',
+    f'''
+    INSERT OR IGNORE INTO people (name)
+    SELECT trim(names.value) FROM movies, {SPLIT_NAMES.format(column='actors')} AS names
+    WHERE movies.id IN (SELECT value FROM json_each(:ids)) AND trim(names.value) != ''
+    ''',
+    f'''
+    INSERT OR IGNORE INTO movie_genres (movie_id, genre_id)
+    SELECT movies.id, genres.id
+    FROM movies, {SPLIT_NAMES.format(column='genre')} AS names
+    JOIN genres ON genres.name = trim(names.value)
+    WHERE movies.id IN (SELECT value FROM json_each(:ids))
+    ''',
+    f'''
+    INSERT OR IGNORE INTO movie_actors (movie_id, person_id, position)
+    SELECT movies.id, people.id, names.key
+    FROM movies, {SPLIT_NAMES.format(column='actors')} AS names
+    JOIN people ON people.name = trim(names.value)
+    WHERE movies.id IN (SELECT value FROM json_each(:ids))
+    ''',
+]
+
+def link_movies(conn, movie_ids):
+    # Rebuild the genre and actor links of the given movies from their
+    # comma-separated columns, inside the caller's transaction. The split and
+    # lookups run set-based in SQLite, which keeps bulk imports fast.
+    params = {'ids': json.dumps(list(movie_ids))}
+    for statement in LINK_STATEMENTS:
+        conn.execute(statement, params)
+
+@contextmanager
+def bulk_load(conn):
+    # Inside the caller's write transaction: inserts skip the per-row search
+    # trigger, and the new rows are indexed in one pass at the end. The marker
+    # row is never committed, so other connections are unaffected.
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM movies').fetchone()[0]
+    conn.execute('INSERT INTO movies_bulk_load (active) VALUES (1)')
+    yield
+    conn.execute('DELETE FROM movies_bulk_load')
+    conn.execute('''
+        INSERT INTO movies_fts (rowid, movie_name, director, actors, genre, note)
+        SELECT id, movie_name, director, actors, genre, note FROM movies WHERE id > ?
+    ''', (last_id,))
+    link_movies(conn, [row[0] for row in conn.execute(
+        'SELECT id FROM movies WHERE id > ?', (last_id,))])
+
+def keyset_conditions(sort_field, sort_order, after, table='movies'):
+    # The rows that follow after = (sort value, id) in ORDER BY sort_field, id,
+    # as conditions an index can seek to. NULLs sort first, so the rest of a
+    # NULL block and the non-NULL values are two separate ranges.
+    value, row_id = after
+    row_id_column = f"{table}.id"
+    if not sort_field:
+        return [(f" AND {row_id_column} > ?", [row_id])]
+    column = f"{table}.{sort_field}"
+    if sort_order == 'DESC':
+        if value is None:
+            return [(f" AND {column} IS NULL AND {row_id_column} < ?", [row_id])]
+        return [(f" AND {column} <= ? AND ({column} < ? OR {row_id_column} < ?)",
+                 [value, value, row_id]),
+                (f" AND {column} IS NULL", [])]
+    if value is None:
+        return [(f" AND {column} IS NULL AND {row_id_column} > ?", [row_id]),
+                (f" AND {column} IS NOT NULL", [])]
+    return [(f" AND {column} >= ? AND ({column} > ? OR {row_id_column} > ?)",
+             [value, value, row_id])]
+
+def fetch_page(conn, queries, limit=None):
+    # Rows of each query in turn until the page is full. A callable is a
+    # fallback, called with the connection only when nothing was read before
+    # it, and gives the queries read instead.
+    rows = []
+    for entry in queries:
+        if callable(entry):
+            if rows:
+                break
+            return fetch_page(conn, entry(conn), limit)
+        query, params = entry
+        cursor = conn.execute(query, params)
+        if limit is None:
+            rows += cursor.fetchall()
+            continue
+        rows += cursor.fetchmany(limit - len(rows))
+        if len(rows) >= limit:
+            break
+    return rows
+
+def _fts_string(term):
+    return '"' + term.replace('"', '""') + '"'
+
+def fts_query(text, column=None, corrections=None):
+    # Every word must match, each as a quoted prefix so user input is never
+    # parsed as FTS5 syntax. With a column, only that column is searched.
+    # corrections maps a word to the indexed words matched in its place.
+    # Words of punctuation alone, like the "&" of "rock & roll", are left out:
+    # they are no token of the index, so they would match nothing.
+    prefix = f"{column} : " if column else ''
+    parts = []
+    for term in str(text or '').split():
+        words = (corrections or {}).get(term)
+        tokens = tokenize(term)
+        if words:
+            parts.append(f"{prefix}({' OR '.join(_fts_string(word) for word in words)})")
+        elif tokens:
+            parts.append(f"{prefix}{_fts_string(' '.join(tokens))}*")
+        elif any(char.isalnum() for char in term):
+            # Letters tokenize does not know, left to the FTS tokenizer
+            parts.append(f"{prefix}{_fts_string(term)}*")
+    return ' AND '.join(parts)
+
+# Columns of the rows list_movies returns
+MOVIE_ROW_COLUMNS = MOVIE_COLUMNS + ['id', 'watch_day']
+
+MOVIE_BY_ID_QUERY = '''
+    SELECT movie_name, published_year, genre, director,
+           actors, imdb_rating, personal_rating, watch_date, note
+    FROM movies
+    WHERE id=? AND user_id=?
+'''
+
+UPDATE_MOVIE_QUERY = '''
+    UPDATE movies
+    SET movie_name=?, published_year=?, genre=?, director=?,
+        actors=?, imdb_rating=?, personal_rating=?, watch_date=?, note=?
+    WHERE id=? AND user_id=?
+'''
+
+DELETE_MOVIE_QUERY = 'DELETE FROM movies WHERE id=? AND user_id=?'
+
+# What the recommendations learn from, every movie of the user
+MOVIE_PROFILES_QUERY = '''
+    SELECT movie_name, published_year, genre, director, actors, personal_rating
+    FROM movies
+    WHERE user_id=?
+'''
+
+# What duplicate checks compare a new movie with
+MOVIE_TITLES_QUERY = '''
+    SELECT id, movie_name, published_year
+    FROM movies
+    WHERE user_id=?
+'''
+
+# Catalog columns the catalog window can sort on, each has an index
+CATALOG_SORT_FIELDS = ['title', 'year', 'director', 'imdb_rating', 'votes']
+# Without a sort or a search the best rated titles come first, as in the CSV
+CATALOG_DEFAULT_SORT = ('imdb_rating', 'DESC')
+
+# The columns of catalog_fts, a search can be limited to one of them
+CATALOG_SEARCH_FIELDS = ['title', 'director', 'stars', 'genre', 'overview']
+
+# bm25 column weights for catalog_fts, in CATALOG_SEARCH_FIELDS order
+CATALOG_FTS_RANK = 'bm25(catalog_fts, 5.0, 3.0, 3.0, 2.0, 1.0)'
+
+# Shorter search words are too short to correct, most words are a typo away
+MIN_CORRECTED_LENGTH = 4
+
+# Columns of the rows list_catalog returns
+CATALOG_ROW_COLUMNS = [
+    'title', 'year', 'genre', 'director', 'stars', 'imdb_rating', 'votes', 'in_list', 'id'
+]
+
+# Whether the user's list has a catalog title: the same title whatever its
+# case, from about the same year unless either year is unknown. A blank year
+# is NULL, which every comparison with it would be too, so it is tested
+# first. One seek of idx_movies_user_title for every catalog row read.
+IN_LIST_EXPRESSION = f'''
+    EXISTS (SELECT 1 FROM movies
+            WHERE movies.user_id=? AND movies.movie_name = catalog.title COLLATE NOCASE
+              AND (catalog.year IS NULL OR movies.published_year IS NULL
+                   OR movies.published_year <= 0
+                   OR abs(movies.published_year - catalog.year) <= {YEAR_TOLERANCE}))
+'''
+
+INSERT_CATALOG_QUERY = f'''
+    INSERT INTO catalog ({', '.join(CATALOG_COLUMNS)})
+    VALUES ({', '.join('?' * len(CATALOG_COLUMNS))})
+'''
+
+def catalog_sort(sort_field, sort_order, search=None):
+    # (sort field, order) the catalog rows are listed in, no field for
+    # search results in rank order
+    if sort_field in CATALOG_SORT_FIELDS:
+        return sort_field, sort_order
+    if fts_query(search):
+        return None, None
+    return CATALOG_DEFAULT_SORT
+
+class MovieRepository:
+    def __init__(self, path=DATABASE_PATH, pool_size=4, busy_timeout=5.0,
+                 cached_statements=256, query_log=None):
+        self.path = path
+        # A QueryLog records every statement run on the connections
+        self.query_log = query_log
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self._connections = []
+        self._closed = False
+
+    def _open_connection(self):
+        # Statements are cached per connection by the sqlite3 module, so the
+        # SQL text used below is kept constant and only parameters change
+        factory = sqlite3.Connection if self.query_log is None else TracedConnection
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                               check_same_thread=False,
+                               cached_statements=self.cached_statements,
+                               factory=factory)
+        if self.query_log is not None:
+            conn.query_log = self.query_log
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout * 1000)}')
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _acquire(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Repository has been closed.")
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = len(self._connections) < self._pool.maxsize
+        if can_open:
+            return self._open_connection()
+        # Every connection is in use, wait for one to be released
+        return self._pool.get()
+
+    def _release(self, conn):
+        if self._closed:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._pool.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        # immediate takes the write lock up front instead of at the first write
+        with self.connection() as conn:
+            with conn:
+                if immediate:
+                    conn.execute('BEGIN IMMEDIATE')
+                yield conn
+
+    def fetchone(self, query, params=()):
+        with self.connection() as conn:
+            return conn.execute(query, params).fetchone()
+
+    def fetchall(self, query, params=()):
+        with self.connection() as conn:
+            return conn.execute(query, params).fetchall()
+
+    def execute(self, query, params=()):
+        with self.transaction() as conn:
+            cursor = conn.execute(query, params)
+            return cursor.lastrowid, cursor.rowcount
+
+    def executescript(self, script):
+        with self.connection() as conn:
+            conn.executescript(script)
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+    # Schema
+
+    def setup(self):
+        self.executescript('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE,
+                password TEXT,
+                security_question TEXT,
+                security_answer TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS movies (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                movie_name TEXT,
+                published_year INTEGER,
+                genre TEXT,
+                director TEXT,
+                actors TEXT,
+                imdb_rating REAL,
+                personal_rating REAL,
+                watch_date TEXT,
+                note TEXT,
+                user_id INTEGER,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            );
+        ''')
+        self.migrate()
+
+    def schema_version(self):
+        return self.fetchone('PRAGMA user_version')[0]
+
+    def migrate(self):
+        with self.connection() as conn:
+            current = conn.execute('PRAGMA user_version').fetchone()[0]
+            for version, statements in enumerate(MIGRATIONS, start=1):
+                if version <= current:
+                    continue
+                # DDL and the version bump commit together or not at all
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    # Another process starting at the same time may have
+                    # applied it while this one waited for the lock
+                    current = conn.execute('PRAGMA user_version').fetchone()[0]
+                    if version <= current:
+                        conn.commit()
+                        continue
+                    for statement in statements:
+                        # Data backfills are callables taking the connection
+                        if callable(statement):
+                            statement(conn)
+                        else:
+                            conn.execute(statement)
+                    conn.execute(f'PRAGMA user_version={version}')
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            conn.execute('PRAGMA optimize')
+
+    def query_plan(self, query, params=()):
+        rows = self.fetchall(f'EXPLAIN QUERY PLAN {query}', params)
+        return [row[3] for row in rows]
+
+    def ui_queries(self, user_id=0):
+        # Every statement the windows issue against movies and the catalog,
+        # as (query, params)
+        queries = [self.list_movies_query(user_id, limit=256),
+                   self.list_movies_query(user_id, 'drama', limit=256)]
+        for sort_field, sort_order in list(SORT_OPTIONS.values()) + [(None, None)]:
+            # The seeks that fetch every page after the first
+            for after in ((0, 0), (None, 0)):
+                for keyset in keyset_conditions(sort_field, sort_order, after):
+                    queries.append(self.list_movies_query(user_id, None, sort_field, sort_order,
+                                                          256, keyset=keyset))
+            if sort_field is None:
+                continue
+            queries.append(self.list_movies_query(user_id, None, sort_field, sort_order, 256))
+            queries.append(self.list_movies_query(user_id, 'drama', sort_field, sort_order, 256))
+            queries.append(self.list_movies_query(user_id, None, sort_field, sort_order, 256,
+                                                  search='nolan'))
+        queries.append(self.list_movies_query(user_id, limit=256, search='nolan'))
+        queries.append(self.list_movies_query(user_id, 'drama, crime', limit=256,
+                                              actor_filter='tom hanks'))
+        queries.append(self.list_movies_query(user_id, 'drama | crime', limit=256))
+        queries.append(self.list_movies_query(user_id, 'drama', 'movie_name', 'ASC',
+                                              movie_ids=[0]))
+        queries += [
+            ('SELECT id FROM users WHERE username=? AND password=?', ('', '')),
+            ('SELECT id, security_answer FROM users WHERE username=?', ('',)),
+            (MOVIE_BY_ID_QUERY, (0, user_id)),
+            (UPDATE_MOVIE_QUERY, [None] * len(MOVIE_COLUMNS) + [0, user_id]),
+            (DELETE_MOVIE_QUERY, (0, user_id)),
+            (MOVIE_PROFILES_QUERY, (user_id,)),
+            (MOVIE_TITLES_QUERY, (user_id,)),
+            ('SELECT COUNT(*) FROM movies WHERE user_id=?', (user_id,)),
+        ]
+        return queries + self.catalog_ui_queries(user_id)
+
+    def catalog_ui_queries(self, user_id=0):
+        # Year and rating ranges are left out: the planner may rightly read
+        # a narrow range and sort it, rather than walk the sort index
+        queries = [self.list_catalog_query(user_id, limit=256),
+                   self.list_catalog_query(user_id, search='nolan', limit=256),
+                   self.list_catalog_query(user_id, search='nolan', search_field='director',
+                                           limit=256),
+                   self.list_catalog_query(user_id, hide_listed=True, limit=256),
+                   self.list_catalog_query(user_id, catalog_ids=[0])]
+        for sort_field in CATALOG_SORT_FIELDS:
+            for sort_order in ('ASC', 'DESC'):
+                for after in ((0, 0), (None, 0)):
+                    for keyset in keyset_conditions(sort_field, sort_order, after, 'catalog'):
+                        queries.append(self.list_catalog_query(
+                            user_id, sort_field=sort_field, sort_order=sort_order, limit=256,
+                            keyset=keyset))
+                queries.append(self.list_catalog_query(user_id, sort_field=sort_field,
+                                                       sort_order=sort_order, limit=256))
+                queries.append(self.list_catalog_query(user_id, sort_field=sort_field,
+                                                       sort_order=sort_order, hide_listed=True,
+                                                       limit=256))
+                queries.append(self.list_catalog_query(user_id, search='drama',
+                                                       sort_field=sort_field,
+                                                       sort_order=sort_order, limit=256))
+        return queries
+
+    def find_full_scans(self, user_id=0):
+        # Queries whose plan walks a whole table instead of searching an index,
+        # or sorts the user's rows instead of reading them in index order.
+        # Search results are few and ranked, sorting those is expected, but
+        # the full-text index must be read once, not probed for every row.
+        # people_fts only looks up the names of the actor filter.
+        offenders = []
+        for query, params in self.ui_queries(user_id):
+            plan = self.query_plan(query, params)
+            searched = any(step.startswith(('SCAN movies_fts', 'SCAN catalog_fts'))
+                           for step in plan)
+            if searched and 'VIRTUAL TABLE' not in plan[0] or any(
+                    step.startswith('SCAN ') and 'USING' not in step
+                    and 'VIRTUAL TABLE' not in step
+                    or step.startswith('USE TEMP B-TREE FOR ORDER BY') and not searched
+                    for step in plan):
+                offenders.append((query, plan))
+        return offenders
+
+    # Users
+
+    def find_user(self, username, password_hash):
+        row = self.fetchone('SELECT id FROM users WHERE username=? AND password=?',
+                            (username, password_hash))
+        return row[0] if row else None
+
+    def get_user_id(self, username):
+        row = self.fetchone('SELECT id FROM users WHERE username=?', (username,))
+        return row[0] if row else None
+
+    def register_user(self, username, password_hash, security_question, security_answer):
+        user_id, _ = self.execute('''
+            INSERT INTO users (username, password, security_question, security_answer)
+            VALUES (?, ?, ?, ?)
+        ''', (username, password_hash, security_question, security_answer))
+        return user_id
+
+    def get_security_answer(self, username):
+        return self.fetchone('''
+            SELECT id, security_answer
+            FROM users
+            WHERE username=?
+        ''', (username,))
+
+    def update_password(self, user_id, password_hash):
+        self.execute('''
+            UPDATE users
+            SET password=?
+            WHERE id=?
+        ''', (password_hash, user_id))
+
+    # Movies
+
+    def list_movies_query(self, user_id, genre_filter=None, sort_field=None, sort_order=None,
+                          limit=None, offset=0, search=None, actor_filter=None, movie_ids=None,
+                          keyset=None):
+        # Rows are laid out as MOVIE_ROW_COLUMNS
+        match = fts_query(search)
+        if match:
+            # Full-text hits joined back to the user's rows, best match first.
+            # CROSS JOIN reads the hits once; walking a sort index instead
+            # would run the full-text match again for every row of the user.
+            query = '''
+                SELECT movies.movie_name, movies.published_year, movies.genre, movies.director,
+                       movies.actors, movies.imdb_rating, movies.personal_rating,
+                       movies.watch_date, movies.note, movies.id, movies.watch_day
+                FROM movies_fts
+                CROSS JOIN movies ON movies.id = movies_fts.rowid
+                WHERE movies_fts MATCH ? AND movies.user_id=?
+            '''
+            params = [match, user_id]
+            default_order = f"{FTS_RANK}, movies.id"
+        else:
+            query = '''
+                SELECT movie_name, published_year, genre, director,
+                       actors, imdb_rating, personal_rating, watch_date, note, id, watch_day
+                FROM movies
+                WHERE user_id=?
+            '''
+            params = [user_id]
+            default_order = "movies.id"
+
+        if movie_ids is not None:
+            # Narrowed to known rows, to check them against the current filters
+            query += f" AND movies.id IN ({', '.join('?' * len(movie_ids))})"
+            params += list(movie_ids)
+
+        if keyset is not None:
+            clause, clause_params = keyset
+            query += clause
+            params += clause_params
+
+        # Genres by the start of their name, actors by any of their names
+        for text, link_table, name_table, link_column, name_index in (
+                (genre_filter, 'movie_genres', 'genres', 'genre_id', None),
+                (actor_filter, 'movie_actors', 'people', 'person_id', 'people_fts')):
+            clause, clause_params = facet_filter(text, link_table, name_table, link_column,
+                                                 name_index)
+            query += clause
+            params += clause_params
+
+        # id breaks ties so that pages never overlap or skip rows
+        if sort_field:
+            query += f" ORDER BY movies.{sort_field} {sort_order}, movies.id {sort_order}"
+        else:
+            query += f" ORDER BY {default_order}"
+
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+
+        return query, params
+
+    def list_movies_queries(self, user_id, genre_filter=None, sort_field=None, sort_order=None,
+                            limit=None, offset=0, search=None, actor_filter=None,
+                            movie_ids=None, after=None):
+        # The (query, params) whose rows, read in turn, make up one page. With
+        # after = (sort value, id) of the last row already shown, the next rows
+        # are found by seeking the sort index instead of skipping offset rows.
+        # Search results in rank order have no such key and page by offset.
+        if after is None or (search and not sort_field and fts_query(search)):
+            return [self.list_movies_query(user_id, genre_filter, sort_field, sort_order,
+                                           limit, offset, search, actor_filter, movie_ids)]
+        return [self.list_movies_query(user_id, genre_filter, sort_field, sort_order, limit, 0,
+                                       search, actor_filter, movie_ids, keyset)
+                for keyset in keyset_conditions(sort_field, sort_order, after)]
+
+    def list_movies(self, user_id, genre_filter=None, sort_field=None, sort_order=None,
+                    limit=None, offset=0, search=None, actor_filter=None, movie_ids=None,
+                    after=None):
+        queries = self.list_movies_queries(user_id, genre_filter, sort_field, sort_order, limit,
+                                           offset, search, actor_filter, movie_ids, after)
+        with self.connection() as conn:
+            return fetch_page(conn, queries, limit)
+
+    def count_movies(self, user_id):
+        return self.fetchone('SELECT COUNT(*) FROM movies WHERE user_id=?', (user_id,))[0]
+
+    def get_movie(self, user_id, movie_id):
+        return self.fetchone(MOVIE_BY_ID_QUERY, (movie_id, user_id))
+
+    def insert_movie(self, conn, user_id, movie_data):
+        # Insert inside the caller's transaction, only the columns provided
+        columns = [column for column in MOVIE_COLUMNS if column in movie_data]
+        cursor = conn.execute(f'''
+            INSERT INTO movies ({', '.join(columns + ['user_id'])})
+            VALUES ({', '.join('?' * (len(columns) + 1))})
+        ''', [movie_data[column] for column in columns] + [user_id])
+        link_movies(conn, [cursor.lastrowid])
+        return cursor.lastrowid
+
+    def add_movie(self, user_id, movie_data):
+        with self.transaction() as conn:
+            return self.insert_movie(conn, user_id, movie_data)
+
+    def update_movie(self, user_id, movie_id, movie_data):
+        with self.transaction() as conn:
+            conn.execute(UPDATE_MOVIE_QUERY,
+                         [movie_data.get(column) for column in MOVIE_COLUMNS] + [movie_id, user_id])
+            link_movies(conn, [movie_id])
+
+    def delete_movie(self, user_id, movie_id):
+        self.execute(DELETE_MOVIE_QUERY, (movie_id, user_id))
+
+    def get_movie_profiles(self, user_id):
+        return self.fetchall(MOVIE_PROFILES_QUERY, (user_id,))
+
+    def library_matcher(self, user_id):
+        # (rows of id, movie_name, published_year, TitleMatcher over them), a
+        # match's entry is its row. For checking many movies against the list.
+        rows = self.fetchall(MOVIE_TITLES_QUERY, (user_id,))
+        return rows, TitleMatcher([row[1] for row in rows], [row[2] for row in rows])
+
+    # Catalog
+
+    def has_dump_catalog(self):
+        # Whether titles from the IMDb dumps are loaded, see imdb_dump.py
+        return self.fetchone(
+            'SELECT EXISTS (SELECT 1 FROM catalog WHERE tconst IS NOT NULL)')[0] == 1
+
+    def load_catalog(self, csv_path):
+        # Fills the catalog table from the catalog CSV, again only when the
+        # file's contents changed since. True when the table was rewritten.
+        # Titles from the IMDb dumps replace the CSV for good.
+        if self.has_dump_catalog():
+            return False
+        stat = os.stat(csv_path)
+        path = os.path.abspath(csv_path)
+        source = self.fetchone('SELECT mtime_ns, size, sha256 FROM catalog_sources WHERE path=?',
+                               (path,))
+        if source and tuple(source[:2]) == (stat.st_mtime_ns, stat.st_size):
+            return False
+        digest = file_hash(csv_path)
+        changed = not source or source[2] != digest
+        rows = []
+        if changed:
+            catalog = load_catalog_snapshot(csv_path)
+            for row in range(len(catalog)):
+                values = catalog.row(row)
+                values['stars'] = catalog.actors(row)
+                rows.append([values[column] for column in CATALOG_COLUMNS])
+        with self.transaction(immediate=True) as conn:
+            if changed:
+                conn.execute('DELETE FROM catalog WHERE tconst IS NULL')
+                conn.executemany(INSERT_CATALOG_QUERY, rows)
+                conn.execute("INSERT INTO catalog_fts (catalog_fts) VALUES ('rebuild')")
+            conn.execute('''
+                INSERT OR REPLACE INTO catalog_sources (path, mtime_ns, size, sha256)
+                VALUES (?, ?, ?, ?)
+            ''', (path, stat.st_mtime_ns, stat.st_size, digest))
+        return changed
+
+    def catalog_corrections(self, conn, search):
+        # {word: catalog words} for the search words no catalog word starts
+        # with, which match nothing. The candidates share the word's first
+        # two letters, a typo is rarely that early. fts5vocab reads a word's
+        # whole doclist, so this only runs once a search found nothing.
+        corrections = {}
+        for term in str(search or '').split():
+            words = tokenize(term)
+            if len(words) != 1 or len(words[0]) < MIN_CORRECTED_LENGTH:
+                continue
+            word = words[0]
+            if conn.execute('''
+                SELECT EXISTS (SELECT 1 FROM catalog_vocab WHERE term >= ? AND term < ?)
+            ''', (word, word + '\U0010ffff')).fetchone()[0]:
+                continue
+            candidates = conn.execute('''
+                SELECT term FROM catalog_vocab
+                WHERE term >= ? AND term < ? AND length(term) BETWEEN ? AND ?
+            ''', (word[:2], word[:2] + '\U0010ffff', len(word) - 2, len(word) + 2)).fetchall()
+            similar = similar_terms(word, [row[0] for row in candidates])
+            if similar:
+                corrections[term] = similar
+        return corrections
+
+    def list_catalog_query(self, user_id, search=None, search_field=None, sort_field=None,
+                           sort_order=None, min_rating=None, year_from=None, year_to=None,
+                           hide_listed=False, limit=None, offset=0, catalog_ids=None,
+                           keyset=None, corrections=None):
+        # Rows are laid out as CATALOG_ROW_COLUMNS, in_list for user_id
+        columns = f'''
+            catalog.title, catalog.year, catalog.genre, catalog.director, catalog.stars,
+            catalog.imdb_rating, catalog.votes, {IN_LIST_EXPRESSION} AS in_list, catalog.id
+        '''
+        match = fts_query(search, search_field if search_field in CATALOG_SEARCH_FIELDS else None,
+                          corrections)
+        if match:
+            # CROSS JOIN reads the full-text hits once, as for the movie list
+            query = f'''
+                SELECT {columns}
+                FROM catalog_fts
+                CROSS JOIN catalog ON catalog.id = catalog_fts.rowid
+                WHERE catalog_fts MATCH ?
+            '''
+            params = [user_id, match]
+        else:
+            query = f"SELECT {columns} FROM catalog WHERE 1"
+            params = [user_id]
+
+        if catalog_ids is not None:
+            query += f" AND catalog.id IN ({', '.join('?' * len(catalog_ids))})"
+            params += list(catalog_ids)
+
+        if keyset is not None:
+            clause, clause_params = keyset
+            query += clause
+            params += clause_params
+
+        if min_rating:
+            query += " AND catalog.imdb_rating >= ?"
+            params.append(min_rating)
+        if year_from:
+            query += " AND catalog.year >= ?"
+            params.append(year_from)
+        if year_to:
+            query += " AND catalog.year <= ?"
+            params.append(year_to)
+        if hide_listed:
+            query += f" AND NOT {IN_LIST_EXPRESSION}"
+            params.append(user_id)
+
+        sort_field, sort_order = catalog_sort(sort_field, sort_order, search)
+        if sort_field:
+            query += f" ORDER BY catalog.{sort_field} {sort_order}, catalog.id {sort_order}"
+        else:
+            query += f" ORDER BY {CATALOG_FTS_RANK}, catalog.id"
+
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+
+        return query, params
+
+    def list_catalog_queries(self, user_id, limit=None, offset=0, after=None, **query):
+        # Pages like list_movies_queries: by keyset after the last row shown,
+        # by offset for search results in rank order. after = (sort value, id)
+        # of the last row in catalog_sort order.
+        sort_field, sort_order = catalog_sort(query.get('sort_field'), query.get('sort_order'),
+                                              query.get('search'))
+        if after is None or not sort_field:
+            queries = [self.list_catalog_query(user_id, limit=limit, offset=offset, **query)]
+        else:
+            queries = [self.list_catalog_query(user_id, limit=limit, keyset=keyset, **query)
+                       for keyset in keyset_conditions(sort_field, sort_order, after, 'catalog')]
+        if query.get('corrections') is None and fts_query(query.get('search')):
+            # A misspelled word matches nothing, the search is then read
+            # again with it corrected, "godfater" finds The Godfather
+            def corrected(conn):
+                corrections = self.catalog_corrections(conn, query['search'])
+                if not corrections:
+                    return []
+                return self.list_catalog_queries(user_id, limit, offset, after,
+                                                 corrections=corrections, **query)
+
+            queries.append(corrected)
+        return queries
+
+    def list_catalog(self, user_id, limit=None, offset=0, after=None, **query):
+        queries = self.list_catalog_queries(user_id, limit, offset, after, **query)
+        with self.connection() as conn:
+            return fetch_page(conn, queries, limit)
+
+    def count_catalog(self):
+        return self.fetchone('SELECT COUNT(*) FROM catalog')[0]
+
+    # OCR cache
+
+    def get_ocr_texts(self, content_hashes):
+        # {content hash: text} for the hashes already recognized
+        content_hashes = list(content_hashes)
+        texts = {}
+        with self.connection() as conn:
+            # Chunked to stay under SQLite's bound parameter limit
+            for start in range(0, len(content_hashes), 500):
+                batch = content_hashes[start:start + 500]
+                texts.update(conn.execute(f'''
+                    SELECT content_hash, text FROM ocr_cache
+                    WHERE content_hash IN ({', '.join('?' * len(batch))})
+                ''', batch).fetchall())
+        return texts
+
+    def save_ocr_text(self, content_hash, text):
+        self.execute('''
+            INSERT OR REPLACE INTO ocr_cache (content_hash, text) VALUES (?, ?)
+        ''', (content_hash, text))
+
+_repository = None
+_repository_lock = threading.Lock()
+
+def get_repository():
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = MovieRepository(query_log=get_query_log())
+        return _repository
@@ -0,0 +1,150 @@
+import os
+import csv
+import sys
+import json
+import argparse
+
+from database import MOVIE_COLUMNS, MovieRepository, DATABASE_PATH
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Column names double as the file's header, ImportDialog maps them back
+EXPORT_QUERY = f'''
+    SELECT {', '.join(MOVIE_COLUMNS)}
+    FROM movies
+    WHERE user_id=?
+    ORDER BY id
+'''
+
+class CsvExportWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(MOVIE_COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class JsonLinesExportWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, rows):
+        self.file.write(''.join(json.dumps(dict(zip(MOVIE_COLUMNS, row)), ensure_ascii=False) + '\n'
+                                for row in rows))
+
+    def close(self):
+        self.file.close()
+
+def _typed(values, kind):
+    # SQLite may hold text in a numeric column, Parquet columns have one type
+    return [value if isinstance(value, kind) and not isinstance(value, bool) else None
+            for value in values]
+
+class ParquetExportWriter:
+    # Needs pyarrow, which is only imported when a Parquet file is written
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.types = {
+            'published_year': (pa.int64(), int),
+            'imdb_rating': (pa.float64(), (int, float)),
+            'personal_rating': (pa.float64(), (int, float)),
+        }
+        self.schema = pa.schema([(column, self.types.get(column, (pa.string(), str))[0])
+                                 for column in MOVIE_COLUMNS])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        # Every batch becomes one row group
+        arrays = []
+        for column, values in zip(MOVIE_COLUMNS, zip(*rows)):
+            arrow_type, kind = self.types.get(column, (self.pa.string(), str))
+            arrays.append(self.pa.array(_typed(values, kind), type=arrow_type))
+        self.writer.write_batch(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+EXPORT_WRITERS = {
+    '.csv': CsvExportWriter,
+    '.jsonl': JsonLinesExportWriter,
+    '.parquet': ParquetExportWriter,
+}
+
+def export_writer(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXPORT_WRITERS:
+        raise ValueError(f"Unsupported export format '{extension}', "
+                         f"use one of {', '.join(EXPORT_WRITERS)}")
+    return EXPORT_WRITERS[extension]
+
+def export_movies(repository, user_id, path, batch_size=DEFAULT_BATCH_SIZE, progress=None,
+                  should_cancel=None):
+    # Streams the user's movies from one cursor to the file a batch at a time,
+    # so memory does not grow with the library. Returns the number of movies
+    # written, or None when cancelled.
+    writer_class = export_writer(path)
+    total = repository.count_movies(user_id)
+    # Written next to the target and moved over it at the end, so a failed or
+    # cancelled export never leaves a truncated file behind
+    temp_path = path + '.tmp'
+    exported = 0
+    completed = False
+    try:
+        with repository.connection() as conn:
+            cursor = conn.execute(EXPORT_QUERY, (user_id,))
+            writer = writer_class(temp_path)
+            try:
+                while True:
+                    if should_cancel and should_cancel():
+                        return None
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    writer.write(rows)
+                    exported += len(rows)
+                    if progress:
+                        progress(exported, total)
+            finally:
+                writer.close()
+        os.replace(temp_path, path)
+        completed = True
+    finally:
+        if not completed and os.path.exists(temp_path):
+            os.remove(temp_path)
+    return exported
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a user's movies without the GUI.")
+    parser.add_argument('username')
+    parser.add_argument('output', help="target file, .csv, .jsonl or .parquet")
+    parser.add_argument('--database', default=DATABASE_PATH)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    try:
+        export_writer(args.output)
+    except ValueError as e:
+        parser.error(str(e))
+    if not os.path.exists(args.database):
+        parser.error(f"no database at {args.database}")
+    repository = MovieRepository(args.database)
+    try:
+        repository.setup()
+        user_id = repository.get_user_id(args.username)
+        if user_id is None:
+            parser.error(f"no user named '{args.username}'")
+        exported = export_movies(repository, user_id, args.output, args.batch_size)
+    finally:
+        repository.close()
+    print(f"Exported {exported} movies to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+from operator import itemgetter
+
+from database import DATABASE_PATH, MovieRepository
+
+# Lines of a dump file per transaction, also the most a resumed run repeats
+DEFAULT_CHUNK_SIZE = 50000
+# Title types taken from title.basics, episodes, shorts and series are not movies
+TITLE_TYPES = {'movie', 'tvMovie'}
+# Actors listed in the stars column, in billing order
+STAR_COUNT = 4
+# How the dumps write a missing value
+NULL = '\\N'
+
+def _int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def parse_basics(tconst, title_type, title, is_adult, year, runtime, genres):
+    if title_type not in TITLE_TYPES or is_adult == '1' or title == NULL:
+        return None
+    genre = '' if genres == NULL else genres.replace(',', ', ')
+    return tconst, title, _int(year), _int(runtime), genre
+
+def parse_ratings(tconst, rating, votes):
+    return _float(rating), _int(votes), tconst
+
+def parse_principals(tconst, ordering, nconst, category):
+    if category not in ('director', 'actor', 'actress'):
+        return None
+    return _int(ordering), category, nconst, tconst
+
+def parse_names(nconst, name):
+    if name == NULL:
+        return None
+    return nconst, name, nconst
+
+class DumpStep:
+    # One dump file: the columns read from it, parse(*values) -> parameters
+    # for sql or None to skip the line, and a statement run before the first
+    # chunk
+    def __init__(self, name, columns, parse, sql, start_sql=None, required=False):
+        self.name = name
+        self.columns = columns
+        self.parse = parse
+        self.sql = sql
+        self.start_sql = start_sql
+        self.required = required
+
+# In order, each step needs the rows of the ones before it
+DUMP_STEPS = [
+    DumpStep(
+        'title.basics',
+        ['tconst', 'titleType', 'primaryTitle', 'isAdult', 'startYear', 'runtimeMinutes',
+         'genres'],
+        parse_basics,
+        '''
+        INSERT INTO catalog (tconst, title, year, runtime, genre) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (tconst) DO UPDATE SET
+            title=excluded.title, year=excluded.year, runtime=excluded.runtime,
+            genre=excluded.genre
+        ''',
+        # The dump replaces the top 1000 CSV
+        start_sql='DELETE FROM catalog WHERE tconst IS NULL',
+        required=True,
+    ),
+    DumpStep(
+        'title.ratings',
+        ['tconst', 'averageRating', 'numVotes'],
+        parse_ratings,
+        'UPDATE catalog SET imdb_rating=?, votes=? WHERE tconst=?',
+    ),
+    # Most principals belong to episodes and other titles not in the
+    # catalog, those find no row to insert
+    DumpStep(
+        'title.principals',
+        ['tconst', 'ordering', 'nconst', 'category'],
+        parse_principals,
+        '''
+        INSERT OR REPLACE INTO catalog_principals (catalog_id, ordering, category, nconst)
+        SELECT id, ?, ?, ? FROM catalog WHERE tconst=?
+        ''',
+    ),
+    # Only the names of the catalog's directors and actors are kept
+    DumpStep(
+        'name.basics',
+        ['nconst', 'primaryName'],
+        parse_names,
+        '''
+        INSERT OR REPLACE INTO catalog_names (nconst, name)
+        SELECT ?, ? WHERE EXISTS (SELECT 1 FROM catalog_principals WHERE nconst=?)
+        ''',
+    ),
+]
+
+# Writes the director and stars columns of the dump titles in an id range
+# from their principals, in billing order
+PEOPLE_SQL = f'''
+    UPDATE catalog SET
+        director = (SELECT group_concat(name, ', ') FROM (
+            SELECT catalog_names.name FROM catalog_principals
+            JOIN catalog_names ON catalog_names.nconst = catalog_principals.nconst
+            WHERE catalog_principals.catalog_id = catalog.id
+              AND catalog_principals.category = 'director'
+            ORDER BY catalog_principals.ordering)),
+        stars = (SELECT group_concat(name, ', ') FROM (
+            SELECT catalog_names.name FROM catalog_principals
+            JOIN catalog_names ON catalog_names.nconst = catalog_principals.nconst
+            WHERE catalog_principals.catalog_id = catalog.id
+              AND catalog_principals.category IN ('actor', 'actress')
+            ORDER BY catalog_principals.ordering
+            LIMIT {STAR_COUNT}))
+    WHERE id > ? AND id <= ? AND tconst IS NOT NULL
+'''
+
+def dump_path(directory, name):
+    # The file of a dump as downloaded, or unpacked
+    for suffix in ('.tsv.gz', '.tsv'):
+        path = os.path.join(directory, name + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+def dump_fingerprint(paths):
+    # Changes when any of the files is replaced, which restarts the ingestion
+    files = []
+    for name, path in sorted(paths.items()):
+        stat = os.stat(path)
+        files.append([name, stat.st_size, stat.st_mtime_ns])
+    return json.dumps(files)
+
+def read_lines(path, columns, position=0):
+    # Yields (values of columns, position after the line, share of the file
+    # read) for the lines after position. Positions are offsets into the
+    # uncompressed data, a gzip file is decompressed up to them on resume.
+    size = os.path.getsize(path) or 1
+    with open(path, 'rb') as raw:
+        f = gzip.GzipFile(fileobj=raw) if path.endswith('.gz') else raw
+        header_line = f.readline()
+        header = header_line.decode('utf-8').rstrip('\r\n').split('\t')
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise ValueError(f"{os.path.basename(path)} has no {', '.join(missing)} column")
+        pick = itemgetter(*[header.index(column) for column in columns])
+        position = max(position, len(header_line))
+        f.seek(position)
+        for line in f:
+            position += len(line)
+            values = line.decode('utf-8').rstrip('\r\n').split('\t')
+            # A torn last line of an interrupted download
+            if len(values) < len(header):
+                continue
+            yield pick(values), position, raw.tell() / size
+
+class IngestProgress:
+    def __init__(self, repository, fingerprint):
+        self.repository = repository
+        self.fingerprint = fingerprint
+
+    def reset_if_changed(self):
+        # Progress of other files is worthless, start every step over
+        with self.repository.transaction(immediate=True) as conn:
+            conn.execute('DELETE FROM catalog_ingest WHERE fingerprint != ?', (self.fingerprint,))
+
+    def get(self, step):
+        # (position, rows, done) of a step
+        row = self.repository.fetchone(
+            'SELECT position, rows, done FROM catalog_ingest WHERE step=?', (step,))
+        return tuple(row) if row else (0, 0, False)
+
+    def save(self, conn, step, position, rows, done=False):
+        # In the transaction of the chunk it records
+        conn.execute('''
+            INSERT OR REPLACE INTO catalog_ingest (step, fingerprint, position, rows, done)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (step, self.fingerprint, position, rows, done))
+
+def _write_chunk(repository, state, step, chunk, position, rows, first=False, done=False):
+    # Rows written so far, the chunk's and its progress commit together
+    with repository.transaction(immediate=True) as conn:
+        if first and step.start_sql:
+            conn.execute(step.start_sql)
+        rows += max(conn.executemany(step.sql, chunk).rowcount, 0)
+        state.save(conn, step.name, position, rows, done)
+    return rows
+
+def _ingest_file(repository, step, path, state, chunk_size, progress):
+    position, rows, done = state.get(step.name)
+    if done:
+        return rows
+    first = position == 0
+    chunk = []
+    lines = 0
+    for values, position, read in read_lines(path, step.columns, position):
+        parameters = step.parse(*values)
+        if parameters is not None:
+            chunk.append(parameters)
+        lines += 1
+        if lines == chunk_size:
+            rows = _write_chunk(repository, state, step, chunk, position, rows, first)
+            first = False
+            chunk = []
+            lines = 0
+            if progress:
+                progress(step.name, read, rows)
+    rows = _write_chunk(repository, state, step, chunk, position, rows, first, done=True)
+    if progress:
+        progress(step.name, 1.0, rows)
+    return rows
+
+def _ingest_people(repository, state, chunk_size, progress):
+    position, rows, done = state.get('people')
+    if done:
+        return rows
+    last_id = repository.fetchone('SELECT COALESCE(MAX(id), 0) FROM catalog')[0]
+    while True:
+        end = position + chunk_size
+        with repository.transaction(immediate=True) as conn:
+            rows += conn.execute(PEOPLE_SQL, (position, end)).rowcount
+            finished = end >= last_id
+            state.save(conn, 'people', end, rows, finished)
+        position = end
+        if progress:
+            progress('people', min(position / (last_id or 1), 1.0), rows)
+        if finished:
+            return rows
+
+def _build_search_index(repository, state, progress):
+    if state.get('search index')[2]:
+        return
+    # One pass over the whole table, far faster than keeping it in sync per chunk
+    with repository.transaction(immediate=True) as conn:
+        conn.execute("INSERT INTO catalog_fts (catalog_fts) VALUES ('rebuild')")
+        conn.execute('ANALYZE catalog')
+        state.save(conn, 'search index', 0, 0, True)
+    if progress:
+        progress('search index', 1.0, 0)
+
+def ingest_dump(repository, directory, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    # Streams the IMDb dataset files in directory into the catalog table, one
+    # transaction per chunk_size lines, so memory stays bounded by the chunk
+    # and not by the files. Every chunk commits with the position it got to,
+    # an interrupted run picks up after the last committed chunk.
+    # progress(step, share done, rows) is called after each chunk. Returns
+    # {step: rows written}.
+    paths = {}
+    for step in DUMP_STEPS:
+        path = dump_path(directory, step.name)
+        if path is None and step.required:
+            raise FileNotFoundError(f"No {step.name}.tsv.gz in {directory}")
+        if path is not None:
+            paths[step.name] = path
+    state = IngestProgress(repository, dump_fingerprint(paths))
+    state.reset_if_changed()
+
+    rows = {}
+    for step in DUMP_STEPS:
+        if step.name in paths:
+            rows[step.name] = _ingest_file(repository, step, paths[step.name], state,
+                                           chunk_size, progress)
+    rows['people'] = _ingest_people(repository, state, chunk_size, progress)
+    _build_search_index(repository, state, progress)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='imdb_dump.py',
+        description="Load the IMDb dataset dumps (title.basics, title.ratings, "
+                    "title.principals and name.basics .tsv.gz files from "
+                    "https://datasets.imdbws.com) into the catalog. Run it again "
+                    "to resume an interrupted load.")
+    parser.add_argument('directory', help="where the dump files are")
+    parser.add_argument('--database', default=DATABASE_PATH)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="lines per transaction")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+
+    def report(step, share, rows):
+        print(f"\r{step:<18}{share:7.1%}{rows:12,} rows  {time.perf_counter() - started:7.0f} s",
+              end='\n' if share >= 1.0 else '', file=sys.stderr, flush=True)
+
+    repository = MovieRepository(args.database)
+    try:
+        repository.setup()
+        rows = ingest_dump(repository, args.directory, max(args.chunk_size, 1), report)
+        print(f"{rows['title.basics']:,} titles in the catalog", file=sys.stderr)
+    finally:
+        repository.close()
+
+if __name__ == '__main__':
+    main()
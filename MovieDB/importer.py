@@ -0,0 +1,372 @@
+import os
+import sqlite3
+import time
+
+from database import MOVIE_COLUMNS, bulk_load
+from search import YEAR_TOLERANCE
+
+UNMAPPED_COLUMN = "-- Select Column --"
+# Rows per transaction. Other writers wait for at most one chunk, a single
+# transaction for the whole file would hold the write lock for all of it.
+DEFAULT_CHUNK_SIZE = 5000
+# Rows read when sniffing a file for its column names
+HEADER_SAMPLE_ROWS = 5
+# Movie fields an import can take from the IMDB catalog when they are empty
+ENRICHED_FIELDS = ['published_year', 'genre', 'director', 'actors', 'imdb_rating']
+
+class ImportResult:
+    def __init__(self):
+        self.success_count = 0
+        self.error_count = 0
+        # (row number in the file, message) for every row that was not imported
+        self.errors = []
+        self.cancelled = False
+        self.rolled_back = False
+        self.elapsed = 0.0
+        # (first id, last id) of the movies each committed chunk inserted
+        self.inserted_ranges = []
+        # Rows found in the IMDB catalog, rows it filled in and rows that
+        # fit several catalog titles, when the import enriches them
+        self.enriched = False
+        self.catalog_matched = 0
+        self.catalog_filled = 0
+        self.catalog_ambiguous = 0
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        self.errors.append((row_number, message))
+
+    def rows_per_second(self):
+        return self.success_count / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        message = (f"Import completed!\nSuccessfully imported: {self.success_count}\n"
+                   f"Failed: {self.error_count}")
+        if self.rolled_back:
+            return f"Import cancelled, {self.success_count} imported movies were removed again."
+        if self.enriched:
+            message += (f"\nFound in the IMDB catalog: {self.catalog_matched}, "
+                        f"completed from it: {self.catalog_filled}, "
+                        f"ambiguous: {self.catalog_ambiguous}")
+        if self.cancelled:
+            message = "Import cancelled.\n" + message.split('\n', 1)[1]
+        return message
+
+    def error_report(self, limit=1000):
+        lines = [f"Row {row_number}: {message}" for row_number, message in self.errors[:limit]]
+        if len(self.errors) > limit:
+            lines.append(f"... and {len(self.errors) - limit} more")
+        return '\n'.join(lines)
+
+def clean_mapping(mapping):
+    # Drop the movie fields the user left on "-- Select Column --"
+    return {db_col: file_col for db_col, file_col in mapping.items()
+            if file_col and file_col != UNMAPPED_COLUMN}
+
+def prepare_frame(df, mapping):
+    # Mapped columns renamed to movie fields and converted in bulk
+    import pandas as pd
+
+    new_df = pd.DataFrame(index=df.index)
+    for db_col, file_col in mapping.items():
+        if file_col in df.columns:
+            new_df[db_col] = df[file_col]
+
+    for column in ('published_year', 'imdb_rating', 'personal_rating'):
+        if column in new_df.columns:
+            new_df[column] = pd.to_numeric(new_df[column], errors='coerce')
+
+    if 'watch_date' in new_df.columns:
+        watch_date = pd.to_datetime(new_df['watch_date'], errors='coerce')
+        new_df['watch_date'] = watch_date.dt.strftime('%Y-%m-%d')
+
+    return new_df[[column for column in MOVIE_COLUMNS if column in new_df.columns]]
+
+# Accents NFKD splits off, removed before the rest of the punctuation
+COMBINING_MARKS = '[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]'
+
+def title_keys(titles):
+    # search.title_key for a whole column at once
+    keys = (titles.fillna('').astype(str).str.lower().str.normalize('NFKD')
+            .str.replace(COMBINING_MARKS, '', regex=True)
+            .str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip())
+    return keys.str.replace(r'^(?:the|an?) ', '', regex=True)
+
+def _blank(column):
+    # Missing, or text that is only whitespace
+    if column.dtype.kind in 'iuf':
+        return column.isna()
+    return column.isna() | (column.astype(str).str.strip() == '')
+
+def enrich_frame(df, catalog, result):
+    # Fills the empty ENRICHED_FIELDS of a prepared frame from the catalog.
+    # One merge on the title key pairs every row with the catalog titles of
+    # that key, the year then picks the closest within YEAR_TOLERANCE.
+    import numpy as np
+    import pandas as pd
+
+    result.enriched = True
+    if 'movie_name' not in df.columns or df.empty:
+        return df
+    years = df['published_year'] if 'published_year' in df.columns else np.nan
+    rows = pd.DataFrame({'row': df.index, 'title_key': title_keys(df['movie_name']),
+                         'year': years})
+    pairs = rows.merge(catalog.enrichment_frame(), on='title_key')
+    # Unknown years on either side fit any year
+    distance = (pairs['year'] - pairs['published_year']).abs().fillna(0)
+    pairs = pairs[(distance <= YEAR_TOLERANCE)
+                  & (distance == distance.groupby(pairs['row']).transform('min'))]
+    candidates = pairs['row'].map(pairs['row'].value_counts())
+    result.catalog_ambiguous += int(pairs.loc[candidates > 1, 'row'].nunique())
+    matches = pairs[candidates == 1].set_index('row')
+    result.catalog_matched += len(matches)
+
+    df = df.copy()
+    filled = pd.Series(False, index=matches.index)
+    for field in ENRICHED_FIELDS:
+        if field not in df.columns:
+            df[field] = np.nan if field in ('published_year', 'imdb_rating') else None
+        source = matches[field]
+        take = _blank(df.loc[matches.index, field]) & ~_blank(source)
+        df.loc[take[take].index, field] = source[take]
+        filled |= take
+    result.catalog_filled += int(filled.sum())
+    return df[[column for column in MOVIE_COLUMNS if column in df.columns]]
+
+def frame_rows(df, user_id):
+    # Plain tuples with None for missing values, ready for executemany
+    values = df.astype(object).where(df.notna(), None)
+    values['user_id'] = user_id
+    return list(values.itertuples(index=False, name=None))
+
+def _insert_rows(conn, insert_sql, rows, row_numbers=None, result=None):
+    with bulk_load(conn):
+        if result is None:
+            conn.executemany(insert_sql, rows)
+            return len(rows)
+        inserted = 0
+        for row, row_number in zip(rows, row_numbers):
+            try:
+                conn.execute(insert_sql, row)
+                inserted += 1
+            except sqlite3.Error as e:
+                result.add_error(row_number, str(e))
+        return inserted
+
+def _max_movie_id(conn):
+    return conn.execute('SELECT COALESCE(MAX(id), 0) FROM movies').fetchone()[0]
+
+def _insert_chunk(repository, insert_sql, rows, row_numbers, result):
+    # The whole chunk goes in with one executemany. If any row is rejected the
+    # chunk is rolled back and retried row by row to report exactly which.
+    try:
+        with repository.transaction(immediate=True) as conn:
+            first_id = _max_movie_id(conn)
+            inserted = _insert_rows(conn, insert_sql, rows)
+            last_id = _max_movie_id(conn)
+    except sqlite3.Error:
+        with repository.transaction(immediate=True) as conn:
+            first_id = _max_movie_id(conn)
+            inserted = _insert_rows(conn, insert_sql, rows, row_numbers, result)
+            last_id = _max_movie_id(conn)
+    # The write lock is held for the whole chunk, so the new ids are contiguous
+    if last_id > first_id:
+        result.inserted_ranges.append((first_id + 1, last_id))
+    return inserted
+
+def import_frame(repository, user_id, df, chunk_size=DEFAULT_CHUNK_SIZE,
+                 progress=None, should_cancel=None, result=None, row_offset=0):
+    # Writes a prepared frame with executemany, one transaction per chunk.
+    # progress(rows_done, rows_total) is called after every committed chunk.
+    result = result or ImportResult()
+    started = time.perf_counter()
+    columns = list(df.columns) + ['user_id']
+    insert_sql = (f"INSERT INTO movies ({', '.join(columns)}) "
+                  f"VALUES ({', '.join('?' * len(columns))})")
+    total = len(df)
+
+    for start in range(0, total, chunk_size):
+        if should_cancel and should_cancel():
+            result.cancelled = True
+            break
+        chunk = df.iloc[start:start + chunk_size]
+        rows = frame_rows(chunk, user_id)
+        # Row numbers as a spreadsheet shows them, counting the header
+        row_numbers = range(row_offset + start + 2, row_offset + start + 2 + len(rows))
+
+        result.success_count += _insert_chunk(repository, insert_sql, rows, row_numbers, result)
+
+        if progress:
+            progress(min(start + chunk_size, total), total)
+
+    result.elapsed += time.perf_counter() - started
+    return result
+
+def import_movies(repository, user_id, movies, chunk_size=DEFAULT_CHUNK_SIZE, result=None):
+    # Bulk insert of movie dicts, as MovieDialog.get_movie_data returns them.
+    # Row numbers in the error report count the movies from 1.
+    result = result or ImportResult()
+    started = time.perf_counter()
+    columns = [column for column in MOVIE_COLUMNS if any(column in movie for movie in movies)]
+    insert_sql = (f"INSERT INTO movies ({', '.join(columns + ['user_id'])}) "
+                  f"VALUES ({', '.join('?' * (len(columns) + 1))})")
+    for start in range(0, len(movies), chunk_size):
+        rows = [tuple(movie.get(column) for column in columns) + (user_id,)
+                for movie in movies[start:start + chunk_size]]
+        row_numbers = range(start + 1, start + 1 + len(rows))
+        result.success_count += _insert_chunk(repository, insert_sql, rows, row_numbers, result)
+    result.elapsed += time.perf_counter() - started
+    return result
+
+def is_csv(path):
+    return path.lower().endswith('.csv')
+
+def _header_name(value, position):
+    # Same names pandas gives blank header cells
+    return f"Unnamed: {position}" if value is None else str(value)
+
+def file_extension(path):
+    return os.path.splitext(path)[1].lower()
+
+def read_columns(path):
+    # Column names from the first rows only, never the whole file
+    if is_csv(path):
+        import pandas as pd
+        return pd.read_csv(path, nrows=HEADER_SAMPLE_ROWS).columns.tolist()
+    if file_extension(path) == '.jsonl':
+        import pandas as pd
+        return pd.read_json(path, lines=True, nrows=HEADER_SAMPLE_ROWS, dtype=False,
+                            convert_dates=False).columns.tolist()
+    if file_extension(path) == '.parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).schema_arrow.names
+    if path.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            header = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+        return [_header_name(value, position) for position, value in enumerate(header)]
+    import pandas as pd
+    return pd.read_excel(path, nrows=HEADER_SAMPLE_ROWS).columns.tolist()
+
+def _csv_chunks(path, columns, chunk_size):
+    import pandas as pd
+
+    total = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        # Exact float parsing, so exported ratings come back unchanged
+        reader = pd.read_csv(f, usecols=columns, chunksize=chunk_size,
+                             float_precision='round_trip')
+        for chunk in reader:
+            # Bytes consumed so far, the parser reads ahead so this is approximate
+            yield chunk, min(f.tell(), total), total
+
+def _jsonl_chunks(path, columns, chunk_size):
+    import pandas as pd
+
+    total = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        # Values are kept as written, prepare_frame does the conversions
+        reader = pd.read_json(f, lines=True, chunksize=chunk_size, dtype=False,
+                              convert_dates=False, precise_float=True)
+        for chunk in reader:
+            # Keys missing from every line of a chunk come back as empty columns
+            yield chunk.reindex(columns=columns), min(f.tell(), total), total
+
+def _parquet_chunks(path, columns, chunk_size):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    total = parquet_file.metadata.num_rows
+    done = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        done += batch.num_rows
+        yield batch.to_pandas(), done, total
+
+def _xlsx_chunks(path, columns, chunk_size):
+    import pandas as pd
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = [_header_name(value, position)
+                  for position, value in enumerate(next(rows, ()))]
+        positions = [header.index(column) for column in columns]
+        # max_row comes from the sheet's stored dimension and may be missing
+        total = max((sheet.max_row or 1) - 1, 0)
+        done = 0
+        batch = []
+        for row in rows:
+            batch.append([row[i] if i < len(row) else None for i in positions])
+            if len(batch) == chunk_size:
+                done += len(batch)
+                yield pd.DataFrame(batch, columns=columns), done, max(total, done)
+                batch = []
+        if batch:
+            done += len(batch)
+            yield pd.DataFrame(batch, columns=columns), done, max(total, done)
+    finally:
+        workbook.close()
+
+def _excel_chunks(path, columns, chunk_size):
+    # Legacy .xls has no streaming reader, it is read once and sliced
+    import pandas as pd
+
+    df = pd.read_excel(path, usecols=columns)
+    for start in range(0, len(df), chunk_size):
+        done = min(start + chunk_size, len(df))
+        yield df.iloc[start:done], done, len(df)
+
+def read_chunks(path, columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Yields (frame, progress_done, progress_total) with only the given columns.
+    # Progress is in bytes for CSV and JSON Lines files and in rows otherwise.
+    if is_csv(path):
+        return _csv_chunks(path, columns, chunk_size)
+    if file_extension(path) == '.jsonl':
+        return _jsonl_chunks(path, columns, chunk_size)
+    if file_extension(path) == '.parquet':
+        return _parquet_chunks(path, columns, chunk_size)
+    if path.lower().endswith('.xlsx'):
+        return _xlsx_chunks(path, columns, chunk_size)
+    return _excel_chunks(path, columns, chunk_size)
+
+def import_file(repository, user_id, path, mapping, chunk_size=DEFAULT_CHUNK_SIZE,
+                progress=None, should_cancel=None, result=None, catalog=None):
+    # Streams the file chunk by chunk from reader to conversion to inserts, so
+    # memory stays bounded by the chunk size rather than the file size. With
+    # a catalog, empty fields are filled from it on the way.
+    result = result or ImportResult()
+    started = time.perf_counter()
+    columns = list(dict.fromkeys(mapping.values()))
+    row_offset = 0
+
+    for chunk, done, total in read_chunks(path, columns, chunk_size):
+        if should_cancel and should_cancel():
+            result.cancelled = True
+            break
+        chunk = chunk.reset_index(drop=True)
+        frame = prepare_frame(chunk, mapping)
+        if catalog is not None:
+            frame = enrich_frame(frame, catalog, result)
+        import_frame(repository, user_id, frame, chunk_size,
+                     should_cancel=should_cancel, result=result, row_offset=row_offset)
+        row_offset += len(chunk)
+        if result.cancelled:
+            break
+        if progress:
+            progress(done, total)
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+def undo_import(repository, result):
+    # Every chunk commits on its own, a cancelled import is undone by deleting
+    # the movies it inserted. The triggers clear their search and facet rows.
+    with repository.transaction(immediate=True) as conn:
+        conn.executemany('DELETE FROM movies WHERE id BETWEEN ? AND ?', result.inserted_ranges)
+    result.inserted_ranges = []
+    result.rolled_back = True
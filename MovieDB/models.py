@@ -0,0 +1,640 @@
+import time
+import threading
+
+from PyQt6.QtCore import (Qt, QAbstractTableModel, QModelIndex, QObject, QRunnable,
+                          QThreadPool, pyqtSignal)
+
+from catalog import get_catalog
+from database import CATALOG_ROW_COLUMNS, MOVIE_ROW_COLUMNS, catalog_sort, fetch_page
+from exporter import export_movies
+from importer import ImportResult, import_file, undo_import
+from ocr import import_images
+from querylog import statement_text
+
+MOVIE_HEADERS = [
+    "Movie Name", "Year", "Genre", "Director",
+    "Actors", "IMDB Rating", "Personal Rating", "Watch Date", "Note"
+]
+
+# One per CATALOG_ROW_COLUMNS column but the trailing id
+CATALOG_HEADERS = [
+    "Title", "Year", "Genre", "Director",
+    "Actors", "IMDB Rating", "Votes", "In My List"
+]
+
+RECOMMENDATION_HEADERS = [
+    "Title", "Year", "Genre", "Director", "IMDB Rating", "Why"
+]
+
+QUERY_STATS_HEADERS = [
+    "Statement", "Calls", "Total (ms)", "Mean (ms)", "Max (ms)", "Rows", "Parameters"
+]
+
+DEFAULT_PAGE_SIZE = 256
+
+# Rows from MovieRepository.list_movies carry the movies.id primary key
+MOVIE_ID_COLUMN = MOVIE_ROW_COLUMNS.index('id')
+CATALOG_ID_COLUMN = CATALOG_ROW_COLUMNS.index('id')
+
+def sort_value(value):
+    # Orders values the way SQLite does: NULL, then numbers, then text
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, value)
+
+def format_watch_date(watch_date):
+    # Stored as YYYY-MM-DD, shown as DD/MM/YYYY
+    if not watch_date:
+        return ""
+    try:
+        year, month, day = watch_date.split('-')
+        return f"{day}/{month}/{year}"
+    except ValueError:
+        return watch_date
+
+def format_movie_cell(movie, column):
+    value = movie[column]
+    if column == 7:
+        return format_watch_date(value)
+    if column in (1, 5, 6):
+        return str(value) if value else ""
+    return value or ""
+
+class QueryWorkerSignals(QObject):
+    finished = pyqtSignal(int, list)
+    failed = pyqtSignal(int, str)
+
+class QueryWorker(QRunnable):
+    # Reads one page on a pooled connection off the GUI thread
+    def __init__(self, repository, generation, queries, limit):
+        super().__init__()
+        self.repository = repository
+        self.generation = generation
+        self.queries = queries
+        self.limit = limit
+        self.signals = QueryWorkerSignals()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._cancelled = False
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            # Only interrupt while the connection is ours, never after release
+            if self._conn is not None:
+                self._conn.interrupt()
+
+    def run(self):
+        try:
+            with self.repository.connection() as conn:
+                with self._lock:
+                    if self._cancelled:
+                        return
+                    self._conn = conn
+                try:
+                    rows = fetch_page(conn, self.queries, self.limit)
+                finally:
+                    with self._lock:
+                        self._conn = None
+        except Exception as e:
+            # Any error, not only a locked or interrupted database, must reach
+            # the model, which waits for a result before it loads more rows
+            if not self._cancelled:
+                self.signals.failed.emit(self.generation, str(e))
+            return
+        if not self._cancelled:
+            self.signals.finished.emit(self.generation, rows)
+
+class ImportWorkerSignals(QObject):
+    # Percent of the file read, movies imported so far and the rows per
+    # second of the last chunk
+    progress = pyqtSignal(int, int, float)
+    # (row number, message) pairs for the rows the last chunk rejected
+    row_errors = pyqtSignal(list)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+class ImportWorker(QRunnable):
+    # Runs the whole read, convert and insert pipeline off the GUI thread
+    def __init__(self, repository, user_id, path, mapping, enrich=False):
+        super().__init__()
+        self.repository = repository
+        self.user_id = user_id
+        self.path = path
+        self.mapping = mapping
+        # Fill empty fields from the IMDB catalog
+        self.enrich = enrich
+        self.result = ImportResult()
+        self.signals = ImportWorkerSignals()
+        self._cancelled = threading.Event()
+        self._rollback = False
+        self._last_count = 0
+        self._last_errors = 0
+        self._last_time = 0.0
+
+    def cancel(self, rollback=False):
+        # Checked between chunks. The chunks committed so far are kept, or
+        # deleted again when rollback is set.
+        self._rollback = rollback
+        self._cancelled.set()
+
+    def _report_progress(self, done, total):
+        now = time.perf_counter()
+        result = self.result
+        elapsed = now - self._last_time
+        rate = (result.success_count - self._last_count) / elapsed if elapsed else 0.0
+        if result.error_count > self._last_errors:
+            self.signals.row_errors.emit(result.errors[self._last_errors:])
+        self._last_count = result.success_count
+        self._last_errors = result.error_count
+        self._last_time = now
+        percent = int(done * 100 / total) if total else 0
+        self.signals.progress.emit(percent, result.success_count, rate)
+
+    def run(self):
+        self._last_time = time.perf_counter()
+        try:
+            # Loaded here, not on the GUI thread
+            catalog = get_catalog() if self.enrich else None
+            import_file(self.repository, self.user_id, self.path, self.mapping,
+                        progress=self._report_progress, should_cancel=self._cancelled.is_set,
+                        result=self.result, catalog=catalog)
+            if self.result.cancelled and self._rollback:
+                undo_import(self.repository, self.result)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(self.result)
+
+class OcrImportWorkerSignals(QObject):
+    # Images read so far and the number of images
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+class OcrImportWorker(QRunnable):
+    # Runs the OCR import off the GUI thread, the images themselves are read
+    # by a process pool
+    def __init__(self, repository, user_id, paths, catalog):
+        super().__init__()
+        self.repository = repository
+        self.user_id = user_id
+        self.paths = paths
+        self.catalog = catalog
+        self.signals = OcrImportWorkerSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def run(self):
+        try:
+            result = import_images(self.repository, self.user_id, self.paths, self.catalog,
+                                   progress=self.signals.progress.emit,
+                                   should_cancel=self._cancelled.is_set)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(result)
+
+class ExportWorkerSignals(QObject):
+    # Movies written so far and the number of movies
+    progress = pyqtSignal(int, int)
+    # Movies written, or None when cancelled
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+class ExportWorker(QRunnable):
+    # Streams the user's movies to a file off the GUI thread
+    def __init__(self, repository, user_id, path):
+        super().__init__()
+        self.repository = repository
+        self.user_id = user_id
+        self.path = path
+        self.signals = ExportWorkerSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def run(self):
+        try:
+            exported = export_movies(self.repository, self.user_id, self.path,
+                                     progress=self.signals.progress.emit,
+                                     should_cancel=self._cancelled.is_set)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(exported)
+
+class PagedTableModel(QAbstractTableModel):
+    # Rows of a query read a page at a time as the view scrolls. Subclasses
+    # give the page queries, the keyset of the last row and the cell text.
+    query_failed = pyqtSignal(str)
+    headers = []
+
+    def __init__(self, repository, user_id, page_size=DEFAULT_PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.repository = repository
+        self.user_id = user_id
+        self.page_size = page_size
+        # Keyword arguments for the repository's list method
+        self.query = {}
+        self._rows = []
+        self._exhausted = False
+        self._generation = 0
+        self._prefetch_generation = 0
+        self._worker = None
+        self._pending_query = None
+        self._prefetch = None
+        self._thread_pool = QThreadPool(self)
+        self._thread_pool.setMaxThreadCount(1)
+
+    def page_queries(self, limit, offset=0, after=None, **query):
+        # The (query, params) whose rows, read in turn, make up one page
+        raise NotImplementedError
+
+    def _after(self):
+        # Keyset of the last loaded row, where the next page starts
+        raise NotImplementedError
+
+    def format_cell(self, row, column):
+        raise NotImplementedError
+
+    def read_page(self, offset=0, after=None, **query):
+        with self.repository.connection() as conn:
+            return fetch_page(conn, self.page_queries(self.page_size, offset, after, **query),
+                              self.page_size)
+
+    def _stop(self, worker):
+        if not self._thread_pool.tryTake(worker):
+            worker.cancel()
+
+    def _drop_prefetch(self):
+        # A page read for rows that have since changed is never appended
+        self._prefetch_generation += 1
+        if self._prefetch is not None:
+            self._stop(self._prefetch)
+            self._prefetch = None
+
+    def _cancel_pending(self):
+        self._generation += 1
+        self._drop_prefetch()
+        if self._worker is not None:
+            self._stop(self._worker)
+            self._worker = None
+
+    def set_query_async(self, **query):
+        # The first page is queried on a worker thread, a newer call cancels
+        # the older one and only the latest result is shown
+        self._cancel_pending()
+        queries = self.page_queries(self.page_size, **query)
+        worker = QueryWorker(self.repository, self._generation, queries, self.page_size)
+        worker.setAutoDelete(False)
+        # Bound slots on the model so results are delivered on the GUI thread
+        worker.signals.finished.connect(self._apply_result)
+        worker.signals.failed.connect(self._query_failed)
+        self._worker = worker
+        self._pending_query = query
+        self._thread_pool.start(worker)
+
+    def _apply_result(self, generation, rows):
+        if generation != self._generation:
+            return
+        self._worker = None
+        self.beginResetModel()
+        self.query = self._pending_query
+        self._rows = rows
+        self._exhausted = len(rows) < self.page_size
+        self.endResetModel()
+
+    def prefetch(self, last_visible_row):
+        # Called as the view scrolls. Once fewer than half a page of loaded rows
+        # is left below the viewport, the next page is read in the background
+        # so it is usually there before the view reaches the end.
+        if (self._worker is not None or self._prefetch is not None or self._exhausted
+                or len(self._rows) - last_visible_row > self.page_size // 2):
+            return
+        queries = self.page_queries(self.page_size, len(self._rows), self._after(), **self.query)
+        worker = QueryWorker(self.repository, self._prefetch_generation, queries, self.page_size)
+        worker.setAutoDelete(False)
+        worker.signals.finished.connect(self._append_page)
+        worker.signals.failed.connect(self._prefetch_failed)
+        self._prefetch = worker
+        self._thread_pool.start(worker)
+
+    def _append_page(self, generation, rows):
+        if generation != self._prefetch_generation:
+            return
+        self._prefetch = None
+        self._append_rows(rows)
+
+    def _prefetch_failed(self, generation, message):
+        if generation != self._prefetch_generation:
+            return
+        # fetchMore reads the page again when the view needs it
+        self._prefetch = None
+
+    def _query_failed(self, generation, message):
+        if generation != self._generation:
+            return
+        self._worker = None
+        self.query_failed.emit(message)
+
+    def is_loading(self):
+        return self._worker is not None
+
+    def wait_for_query(self, msecs=-1):
+        return self._thread_pool.waitForDone(msecs)
+
+    def set_query(self, **query):
+        self._cancel_pending()
+        # Drop everything loaded so far
+        self.beginResetModel()
+        self.query = query
+        self._rows = []
+        self._exhausted = False
+        self.endResetModel()
+        # Fill the first screen right away rather than waiting for the view
+        self.fetchMore()
+
+    def refresh(self):
+        self.set_query(**self.query)
+
+    def remove_row(self, row):
+        self._drop_prefetch()
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]
+        self.endRemoveRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        # Cells are formatted on demand, only for rows the view paints
+        return self.format_cell(self._rows[index.row()], index.column())
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return section + 1
+
+    def canFetchMore(self, parent=QModelIndex()):
+        # Rows for a superseded query must not be appended while one is pending,
+        # and a page being prefetched is not read twice
+        return (not parent.isValid() and not self._exhausted and self._worker is None
+                and self._prefetch is None)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self.canFetchMore():
+            return
+        # Continue after the last loaded row, or from the top for the first page
+        self._append_rows(self.read_page(len(self._rows), self._after(), **self.query))
+
+    def _append_rows(self, rows):
+        if len(rows) < self.page_size:
+            self._exhausted = True
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+class MovieTableModel(PagedTableModel):
+    headers = MOVIE_HEADERS
+
+    def page_queries(self, limit, offset=0, after=None, **query):
+        return self.repository.list_movies_queries(self.user_id, limit=limit, offset=offset,
+                                                   after=after, **query)
+
+    def _after(self):
+        if not self._rows:
+            return None
+        last = self._rows[-1]
+        return (self._sort_value(last), last[MOVIE_ID_COLUMN])
+
+    def format_cell(self, row, column):
+        return format_movie_cell(row, column)
+
+    def movie_at(self, row):
+        return self._rows[row]
+
+    def movie_id_at(self, row):
+        return self._rows[row][MOVIE_ID_COLUMN]
+
+    def _sort_value(self, movie):
+        return movie[MOVIE_ROW_COLUMNS.index(self.query.get('sort_field') or 'id')]
+
+    def _sort_key(self, movie):
+        return (sort_value(self._sort_value(movie)), movie[MOVIE_ID_COLUMN])
+
+    def _insert_position(self, movie):
+        # Binary search over the loaded rows, which are in the query's order
+        key = self._sort_key(movie)
+        descending = self.query.get('sort_order') == 'DESC'
+        low, high = 0, len(self._rows)
+        while low < high:
+            middle = (low + high) // 2
+            middle_key = self._sort_key(self._rows[middle])
+            if (middle_key > key) if descending else (middle_key < key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def remove_movie(self, row):
+        self.remove_row(row)
+
+    def place_movie(self, movie_id):
+        # Shows a new or changed movie where the current query would list it,
+        # without reloading the rows around it
+        if self._worker is not None:
+            # A query is already on its way, restart it so it sees the change
+            self.set_query_async(**self._pending_query)
+            return
+        if self.query.get('search'):
+            # Search rank is only known to SQLite, so requery in the background
+            self.set_query_async(**self.query)
+            return
+        rows = self.repository.list_movies(self.user_id, movie_ids=[movie_id], **self.query)
+        if not rows:
+            # Hidden by the current filters
+            return
+        movie = rows[0]
+        self._drop_prefetch()
+        position = self._insert_position(movie)
+        if position == len(self._rows) and not self._exhausted:
+            # Past the loaded rows, it arrives with a later batch
+            return
+        self.beginInsertRows(QModelIndex(), position, position)
+        self._rows.insert(position, movie)
+        self.endInsertRows()
+
+    def update_movie(self, row, movie_id):
+        # The edit may move the row or hide it under the current filters
+        self.remove_movie(row)
+        self.place_movie(movie_id)
+
+class CatalogTableModel(PagedTableModel):
+    # Pages of MovieRepository.list_catalog. Searches of common words rank
+    # many titles, so they run on the worker thread like the movie list's.
+    headers = CATALOG_HEADERS
+
+    def page_queries(self, limit, offset=0, after=None, **query):
+        return self.repository.list_catalog_queries(self.user_id, limit, offset, after, **query)
+
+    def _after(self):
+        if not self._rows:
+            return None
+        sort_field, _ = catalog_sort(self.query.get('sort_field'), self.query.get('sort_order'),
+                                     self.query.get('search'))
+        if sort_field is None:
+            return None
+        last = self._rows[-1]
+        return last[CATALOG_ROW_COLUMNS.index(sort_field)], last[CATALOG_ID_COLUMN]
+
+    def format_cell(self, row, column):
+        value = row[column]
+        name = CATALOG_ROW_COLUMNS[column]
+        if name == 'in_list':
+            return "Yes" if value else ""
+        if value is None:
+            return ""
+        if name == 'votes':
+            return f"{value:,}"
+        return str(value)
+
+    def catalog_id_at(self, row):
+        return self._rows[row][CATALOG_ID_COLUMN]
+
+    def movie_data(self, row, note=""):
+        # The catalog row as fields of a movie in the user's list
+        title, year, genre, director, stars, imdb_rating = self._rows[row][:6]
+        return {
+            'movie_name': title,
+            'published_year': year or 0,
+            'genre': genre,
+            'director': director,
+            'actors': stars,
+            'imdb_rating': imdb_rating or 0,
+            'personal_rating': 0,
+            'note': note
+        }
+
+    def refresh_row(self, row):
+        # Reads one row again after the user's list changed, it may now be
+        # flagged or hidden by the current filters
+        rows = self.repository.list_catalog(self.user_id, catalog_ids=[self.catalog_id_at(row)],
+                                            **self.query)
+        if not rows:
+            self.remove_row(row)
+            return
+        self._rows[row] = rows[0]
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.headers) - 1))
+
+class RecommendationTableModel(QAbstractTableModel):
+    # recommend.recommend results, best first, shown from the catalog
+    def __init__(self, catalog, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+        self._recommendations = []
+
+    def set_recommendations(self, recommendations):
+        self.beginResetModel()
+        self._recommendations = recommendations
+        self.endResetModel()
+
+    def catalog_row(self, row):
+        return self._recommendations[row].row
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._recommendations)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(RECOMMENDATION_HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        recommendation = self._recommendations[index.row()]
+        row, column = recommendation.row, index.column()
+        catalog = self.catalog
+        if column == 0:
+            return catalog.title[row]
+        if column == 1:
+            return str(catalog.year[row]) if catalog.year[row] else ""
+        if column == 2:
+            return catalog.genre[row]
+        if column == 3:
+            return catalog.director[row]
+        if column == 4:
+            rating = catalog.imdb_rating[row]
+            return str(rating) if rating is not None else ""
+        return ', '.join(recommendation.reasons)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return RECOMMENDATION_HEADERS[section]
+        return section + 1
+
+class QueryStatsTableModel(QAbstractTableModel):
+    # QueryLog.top_queries as a table, copied so the numbers hold still while shown
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+
+    def set_stats(self, stats):
+        self.beginResetModel()
+        self._rows = [(statement_text(stats.sql), stats.calls, stats.total * 1000,
+                       stats.mean() * 1000, stats.max * 1000, stats.rows, stats.param_count)
+                      for stats in stats]
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(QUERY_STATS_HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self._rows[index.row()][index.column()]
+        if role == Qt.ItemDataRole.ToolTipRole and index.column() == 0:
+            return value
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if isinstance(value, float):
+            return f"{value:,.2f}"
+        return str(value)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return QUERY_STATS_HEADERS[section]
+        return section + 1
@@ -0,0 +1,191 @@
+import os
+import re
+
+from catalog import file_hash
+from importer import ImportResult, import_movies
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+# Tesseract install locations, tried in order
+possible_tesseract_paths = [
+    r'C:\Program Files\Tesseract-OCR\tesseract.exe',
+    r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
+    r'C:\Tesseract-OCR\tesseract.exe',
+    r'/usr/bin/tesseract',
+    r'/usr/local/bin/tesseract'
+]
+
+_tesseract_configured = False
+
+def configure_tesseract():
+    # pytesseract and the path probing cost nothing until OCR is first needed
+    global _tesseract_configured
+    import pytesseract
+    if not _tesseract_configured:
+        for path in possible_tesseract_paths:
+            if os.path.exists(path):
+                pytesseract.pytesseract.tesseract_cmd = path
+                break
+        _tesseract_configured = True
+    return pytesseract
+
+def tesseract_text(path):
+    # The default OCR backend. Backends take an image path and return its
+    # text, and run in worker processes, so they must be module-level functions.
+    from PIL import Image
+
+    pytesseract = configure_tesseract()
+    with Image.open(path) as image:
+        return pytesseract.image_to_string(image)
+
+def image_paths(folder):
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+# "1. ", "12) ", "- ", "* " or "• " in front of a list entry
+LIST_MARKER = re.compile(r'^\s*(?:[-*\u2022#]+|\d{1,4}[.)])\s+')
+# A release year at the end of the entry, "(1994)", "[1994]" or "- 1994"
+TRAILING_YEAR = re.compile(r'[\s\-,]*[(\[]?((?:18|19|20)\d{2})[)\]]?\s*$')
+
+def parse_titles(text):
+    # (title, year or None) for every line of the OCR text that reads like an entry
+    titles = []
+    for line in text.splitlines():
+        line = LIST_MARKER.sub('', line).strip()
+        year = None
+        match = TRAILING_YEAR.search(line)
+        if match and match.start() > 0:
+            year = int(match.group(1))
+            line = line[:match.start()].strip()
+        # Stray characters the OCR picked up from borders and icons
+        if sum(char.isalpha() for char in line) < 2:
+            continue
+        titles.append((line, year))
+    return titles
+
+class OcrImportResult:
+    def __init__(self):
+        self.image_count = 0
+        self.cached_count = 0
+        # (image path, message) for images the OCR backend failed on
+        self.failed_images = []
+        self.matched = []
+        self.already_listed = []
+        self.unmatched = []
+        self.cancelled = False
+        self.import_result = ImportResult()
+
+    def summary(self):
+        message = (f"Images read: {self.image_count} ({self.cached_count} from cache)\n"
+                   f"Movies imported: {self.import_result.success_count}\n"
+                   f"Already in your list: {len(self.already_listed)}\n"
+                   f"Not found in the catalog: {len(self.unmatched)}")
+        if self.failed_images:
+            message += f"\nImages that could not be read: {len(self.failed_images)}"
+        if self.cancelled:
+            message = "Import cancelled.\n" + message
+        return message
+
+    def report(self):
+        lines = [f"Could not read {path}: {message}" for path, message in self.failed_images]
+        lines += [f"Not found: {title}" for title in self.unmatched]
+        lines += [f"Already listed: {title}" for title in self.already_listed]
+        return '\n'.join(lines)
+
+def recognize_images(repository, paths, backend=tesseract_text, max_workers=None,
+                     progress=None, should_cancel=None, result=None):
+    # {path: text} for every image that could be read. Texts are cached by
+    # content hash, so only images never seen before go to the process pool.
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    result = result or OcrImportResult()
+    result.image_count = len(paths)
+    hashes = {path: file_hash(path) for path in paths}
+    texts_by_hash = repository.get_ocr_texts(set(hashes.values()))
+    result.cached_count = sum(content_hash in texts_by_hash for content_hash in hashes.values())
+
+    # One path per unseen image, copies of the same image are read once
+    pending = {}
+    for path, content_hash in hashes.items():
+        if content_hash not in texts_by_hash:
+            pending.setdefault(content_hash, path)
+
+    done = len(paths) - len(pending)
+    if progress:
+        progress(done, len(paths))
+    if pending:
+        # Spawned workers, forking a process that runs Qt threads is unsafe
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {executor.submit(backend, path): content_hash
+                       for content_hash, path in pending.items()}
+            for future in as_completed(futures):
+                content_hash = futures[future]
+                try:
+                    text = future.result()
+                except Exception as e:
+                    result.failed_images.append((pending[content_hash], str(e)))
+                else:
+                    # Saved right away so a cancelled run keeps what it read
+                    repository.save_ocr_text(content_hash, text)
+                    texts_by_hash[content_hash] = text
+                done += 1
+                if progress:
+                    progress(done, len(paths))
+                if should_cancel and should_cancel():
+                    result.cancelled = True
+                    executor.shutdown(cancel_futures=True)
+                    break
+
+    return {path: texts_by_hash[content_hash] for path, content_hash in hashes.items()
+            if content_hash in texts_by_hash}
+
+def match_titles(catalog, titles):
+    # Catalog rows for (title, year) pairs, or None. A letter or two the OCR
+    # got wrong still finds the title, a year more than one off does not.
+    matcher = catalog.title_matcher()
+    matches = []
+    for title, year in titles:
+        match = None
+        if year is not None:
+            # The number may belong to the title, as in "Blade Runner 2049"
+            match = matcher.match(f"{title} {year}", fuzzy=False)
+        match = match or matcher.match(title, year)
+        matches.append(match[0] if match else None)
+    return matches
+
+def import_images(repository, user_id, paths, catalog, backend=tesseract_text, max_workers=None,
+                  progress=None, should_cancel=None):
+    # OCR every image, match the listed titles against the catalog and insert
+    # the movies that are not in the user's list yet
+    result = OcrImportResult()
+    texts = recognize_images(repository, paths, backend, max_workers, progress, should_cancel,
+                             result)
+    if result.cancelled:
+        return result
+
+    titles = [title for path in paths if path in texts for title in parse_titles(texts[path])]
+    # Also finds movies the user typed in with another spelling
+    _, library = repository.library_matcher(user_id)
+    movies = []
+    seen = set()
+    for (title, year), row in zip(titles, match_titles(catalog, titles)):
+        if row is None:
+            entry = title if year is None else f"{title} ({year})"
+            if entry not in result.unmatched:
+                result.unmatched.append(entry)
+            continue
+        if row in seen:
+            continue
+        seen.add(row)
+        movie = catalog.movie_data(row, "Imported from images")
+        if library.match(movie['movie_name'], movie['published_year']):
+            result.already_listed.append(movie['movie_name'])
+            continue
+        result.matched.append(movie['movie_name'])
+        movies.append(movie)
+
+    if movies:
+        import_movies(repository, user_id, movies, result=result.import_result)
+    return result
@@ -0,0 +1,232 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import deque
+
+# Statements slower than this are logged with their query plan,
+# MOVIEDB_SLOW_QUERY_MS overrides it
+DEFAULT_SLOW_QUERY_MS = 100.0
+# Executions kept for the diagnostics panel, older ones only count in the totals
+RECENT_QUERIES = 500
+SLOW_QUERIES = 100
+
+def slow_query_ms():
+    try:
+        return max(float(os.environ.get('MOVIEDB_SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)), 0.0)
+    except ValueError:
+        return DEFAULT_SLOW_QUERY_MS
+
+def statement_text(sql):
+    # One line, for the log and the panel
+    return ' '.join(sql.split())
+
+def _param_count(params):
+    return len(params) if params is not None else 0
+
+class QueryRecord:
+    # One execution of a statement. Fetching its rows later adds to the
+    # duration and row count.
+    __slots__ = ('sql', 'param_count', 'duration', 'rows', 'slow')
+
+    def __init__(self, sql, param_count):
+        self.sql = sql
+        self.param_count = param_count
+        self.duration = 0.0
+        self.rows = 0
+        self.slow = False
+
+class QueryStats:
+    # Totals of every execution of one SQL text
+    __slots__ = ('sql', 'param_count', 'calls', 'total', 'max', 'rows')
+
+    def __init__(self, sql, param_count):
+        self.sql = sql
+        self.param_count = param_count
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+class QueryLog:
+    # Shared by every traced connection of a repository, whatever thread
+    # their statements run on
+    def __init__(self, slow_query_ms=DEFAULT_SLOW_QUERY_MS, recent=RECENT_QUERIES):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.recent = deque(maxlen=recent)
+        # (statement text, milliseconds, query plan lines) of the slow ones
+        self.slow_queries = deque(maxlen=SLOW_QUERIES)
+
+    def start(self, sql, param_count):
+        record = QueryRecord(sql, param_count)
+        with self._lock:
+            stats = self._stats.get(sql)
+            if stats is None:
+                stats = self._stats[sql] = QueryStats(sql, param_count)
+            stats.calls += 1
+            self.recent.append(record)
+        return record
+
+    def add(self, record, duration, rows=0):
+        # True the first time the record goes over the slow query threshold
+        with self._lock:
+            record.duration += duration
+            record.rows += rows
+            stats = self._stats[record.sql]
+            stats.total += duration
+            stats.rows += rows
+            stats.max = max(stats.max, record.duration)
+            if record.slow or record.duration * 1000 < self.slow_query_ms:
+                return False
+            record.slow = True
+            return True
+
+    def log_slow(self, record, plan):
+        text = statement_text(record.sql)
+        milliseconds = record.duration * 1000
+        with self._lock:
+            self.slow_queries.append((text, milliseconds, plan))
+        # logging is only imported once there is something to log
+        import logging
+        logging.getLogger('moviedb.sql').warning("Slow query (%.1f ms): %s\n  %s", milliseconds,
+                                                 text, '\n  '.join(plan) or "no query plan")
+
+    def top_queries(self, limit=20):
+        # QueryStats by total time, the statements most worth making faster
+        with self._lock:
+            stats = sorted(self._stats.values(), key=lambda stats: stats.total, reverse=True)
+        return stats[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.recent.clear()
+            self.slow_queries.clear()
+
+# Rows a cursor iterates before it reports them, instead of one at a time
+ITERATION_BATCH = 256
+
+class TracedCursor(sqlite3.Cursor):
+    # Times each statement from execute until its last row is fetched
+    _record = None
+    _params = None
+    _iterated = 0
+    _iteration_time = 0.0
+
+    def _track(self, started, rows=0):
+        record = self._record
+        if record is None:
+            return
+        if self.connection.query_log.add(record, time.perf_counter() - started, rows):
+            self.connection.query_log.log_slow(record, self._plan(record.sql))
+
+    def _plan(self, sql):
+        # A plain cursor, so the EXPLAIN is not traced itself
+        try:
+            rows = sqlite3.Cursor(self.connection).execute(
+                f'EXPLAIN QUERY PLAN {sql}', self._params or ()).fetchall()
+        except sqlite3.Error:
+            return []
+        return [row[3] for row in rows]
+
+    def _start(self, sql, params, param_count):
+        self._record = self.connection.query_log.start(sql, param_count)
+        self._params = params
+        return time.perf_counter()
+
+    def _changed_rows(self):
+        # Rows written, SELECTs report -1 and count their rows as they are fetched
+        return max(self.rowcount, 0)
+
+    def execute(self, sql, params=()):
+        started = self._start(sql, params, _param_count(params))
+        try:
+            return super().execute(sql, params)
+        finally:
+            self._track(started, self._changed_rows())
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        first = seq_of_params[0] if seq_of_params else None
+        started = self._start(sql, first, _param_count(first) * len(seq_of_params))
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            self._track(started, self._changed_rows())
+
+    def executescript(self, script):
+        started = self._start(script, None, 0)
+        try:
+            return super().executescript(script)
+        finally:
+            self._track(started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._track(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._track(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._track(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._report_iterated(started)
+            raise
+        self._iterated += 1
+        self._iteration_time += time.perf_counter() - started
+        if self._iterated >= ITERATION_BATCH:
+            self._report_iterated(time.perf_counter())
+        return row
+
+    def _report_iterated(self, started):
+        # _track with the time and rows iterated since the last report added
+        rows, self._iterated = self._iterated, 0
+        started -= self._iteration_time
+        self._iteration_time = 0.0
+        self._track(started, rows)
+
+class TracedConnection(sqlite3.Connection):
+    # sqlite3.connect factory, every statement run on it lands in query_log
+    query_log = None
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    # The built-in shortcuts open their cursor in C, past cursor() above
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+_query_log = None
+_query_log_lock = threading.Lock()
+
+def get_query_log():
+    global _query_log
+    with _query_log_lock:
+        if _query_log is None:
+            _query_log = QueryLog(slow_query_ms())
+        return _query_log
@@ -0,0 +1,202 @@
+import math
+
+import numpy as np
+
+from database import split_names
+
+# Weight of each feature group, before the rarity weighting
+FEATURE_GROUPS = {
+    'genre': 1.0,
+    'director': 1.0,
+    'star': 0.6,
+    'decade': 0.5,
+    'runtime': 0.3,
+    'meta_score': 0.3,
+}
+
+# Runtime in minutes and Meta_score bucket edges, each bucket is one feature
+RUNTIME_EDGES = [90, 110, 130, 150]
+META_SCORE_EDGES = [60, 70, 80, 90]
+
+# Ratings needed per feature before it counts fully, so one rating does not
+# decide a whole director
+PROFILE_SHRINKAGE = 2.0
+# How much the catalog's own IMDB rating orders titles the profile scores
+# alike, and all titles for a user without ratings
+PRIOR_WEIGHT = 0.15
+
+def _bucket(value, edges):
+    if value is None:
+        return None
+    position = sum(value >= edge for edge in edges)
+    low = edges[position - 1] if position else None
+    high = edges[position] if position < len(edges) else None
+    if low is None:
+        return f"under {high}"
+    if high is None:
+        return f"{low}+"
+    return f"{low}-{high}"
+
+def movie_features(genre, director, actors, year, runtime=None, meta_score=None):
+    # Feature names of one title, the same for catalog rows and library rows
+    features = [('genre', name) for name in split_names(genre)]
+    if director:
+        features += [('director', name) for name in split_names(director)]
+    features += [('star', name) for name in split_names(actors)]
+    # Imported years may be floats, or text that was not a number
+    if isinstance(year, (int, float)) and year > 0:
+        features.append(('decade', f"{int(year) // 10 * 10}s"))
+    if runtime is not None:
+        features.append(('runtime', _bucket(runtime, RUNTIME_EDGES) + " min"))
+    if meta_score is not None:
+        features.append(('meta_score', "Metascore " + _bucket(meta_score, META_SCORE_EDGES)))
+    return features
+
+def feature_key(feature):
+    # Typed names match the catalog's whatever their case
+    group, name = feature
+    return group, name.casefold()
+
+def feature_label(feature):
+    group, name = feature
+    if group == 'director':
+        return f"directed by {name}"
+    if group == 'star':
+        return f"with {name}"
+    return name
+
+class FeatureMatrix:
+    # Catalog rows by features as a CSR sparse matrix: the features of row r
+    # are indices[indptr[r]:indptr[r + 1]] with weights data[...]
+    def __init__(self, features, rows, imdb_ratings):
+        self.features = features
+        self.feature_index = {feature_key(feature): column
+                              for column, feature in enumerate(features)}
+        self.n_rows = len(rows)
+        lengths = np.fromiter((len(columns) for columns in rows), dtype=np.int64,
+                              count=len(rows))
+        self.indptr = np.zeros(self.n_rows + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.indptr[1:])
+        self.indices = np.fromiter((column for columns in rows for column in columns),
+                                   dtype=np.int64, count=int(self.indptr[-1]))
+        # Row of every stored entry, for scoring with one bincount
+        self.row_ids = np.repeat(np.arange(self.n_rows), lengths)
+
+        # Rare features say more about a title than "Drama" does
+        document_frequency = np.bincount(self.indices, minlength=len(features))
+        rarity = np.log1p(self.n_rows / np.maximum(document_frequency, 1))
+        group_weight = np.array([FEATURE_GROUPS[group] for group, _ in features])
+        self.feature_weight = group_weight * rarity
+        self.data = self.feature_weight[self.indices]
+
+        # The catalog's IMDB rating as a z-score, scaled to break ties
+        ratings = np.array([math.nan if rating is None else rating for rating in imdb_ratings],
+                           dtype=float)
+        self.prior = np.zeros(self.n_rows)
+        if np.isfinite(ratings).any():
+            spread = np.nanstd(ratings) or 1.0
+            self.prior = PRIOR_WEIGHT * np.nan_to_num((ratings - np.nanmean(ratings)) / spread)
+
+    def encode(self, features):
+        # Columns of features the catalog has, others cannot score anything
+        columns = (self.feature_index.get(feature_key(feature)) for feature in features)
+        return [column for column in columns if column is not None]
+
+    def scores(self, weights):
+        # Matrix times weight vector, every row in one vectorized pass
+        return np.bincount(self.row_ids, weights=self.data * weights[self.indices],
+                           minlength=self.n_rows) + self.prior
+
+    def contributions(self, row, weights):
+        # (feature, score) of one row, largest first
+        start, end = self.indptr[row], self.indptr[row + 1]
+        columns = self.indices[start:end]
+        values = self.data[start:end] * weights[columns]
+        order = np.argsort(-values)
+        return [(self.features[columns[i]], float(values[i])) for i in order]
+
+def build_feature_matrix(catalog):
+    columns = {}
+    features = []
+    rows = []
+    for row in range(len(catalog)):
+        row_columns = []
+        for feature in movie_features(catalog.genre[row], catalog.director[row],
+                                      catalog.actors(row), catalog.year[row],
+                                      catalog.runtime[row], catalog.meta_score[row]):
+            key = feature_key(feature)
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = len(features)
+                features.append(feature)
+            row_columns.append(column)
+        rows.append(row_columns)
+    return FeatureMatrix(features, rows, catalog.imdb_rating)
+
+class Recommendation:
+    def __init__(self, row, score, reasons):
+        self.row = row
+        self.score = score
+        # Feature labels that raised the score most, "Drama", "with Tom Hanks"
+        self.reasons = reasons
+
+def match_library(catalog, library):
+    # Catalog row of every library movie, None for titles not in the catalog
+    matches = catalog.title_matcher().match_many(
+        (movie_name, year) for movie_name, year, *_ in library)
+    return [match[0] if match else None for match in matches]
+
+def fit_profile(matrix, library, catalog_rows):
+    # Feature weights from the user's ratings: the mean rating of the titles
+    # with a feature, above or below the user's own mean, shrunk toward zero
+    # for features with few ratings. Rows linked to the catalog use its
+    # features, the others what was typed into the movie's fields.
+    encoded = {}
+    columns = []
+    ratings = []
+    for (movie_name, year, genre, director, actors, rating), row in zip(library, catalog_rows):
+        if not rating:
+            continue
+        if row is not None:
+            movie_columns = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+        else:
+            key = genre, director, actors, year
+            if key not in encoded:
+                encoded[key] = matrix.encode(movie_features(genre, director, actors, year))
+            movie_columns = encoded[key]
+        columns.append(movie_columns)
+        ratings.append(float(rating))
+
+    weights = np.zeros(len(matrix.features))
+    if not ratings:
+        return weights
+    lengths = [len(movie_columns) for movie_columns in columns]
+    entries = np.concatenate([np.asarray(movie_columns, dtype=np.int64)
+                              for movie_columns in columns])
+    centered = np.array(ratings) - np.mean(ratings)
+    deviation = np.repeat(centered, lengths)
+    totals = np.bincount(entries, weights=deviation, minlength=len(weights))
+    counts = np.bincount(entries, minlength=len(weights))
+    return totals / (counts + PROFILE_SHRINKAGE)
+
+def recommend(catalog, library, limit=50, reasons=3):
+    # The best scoring catalog titles the user has not watched. library holds
+    # (movie_name, published_year, genre, director, actors, personal_rating)
+    # rows as MovieRepository.get_movie_profiles returns them.
+    matrix = catalog.feature_matrix()
+    catalog_rows = match_library(catalog, library)
+    weights = fit_profile(matrix, library, catalog_rows)
+    scores = matrix.scores(weights)
+    # Titles the user already has
+    scores[[row for row in catalog_rows if row is not None]] = -np.inf
+    limit = min(limit, int(np.isfinite(scores).sum()))
+    if limit <= 0:
+        return []
+    # Only the top titles are sorted, not the whole catalog
+    top = np.argpartition(-scores, limit - 1)[:limit]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [Recommendation(int(row), float(scores[row]),
+                           [feature_label(feature)
+                            for feature, value in matrix.contributions(row, weights)[:reasons]
+                            if value > 0])
+            for row in top]
@@ -0,0 +1,208 @@
+import re
+import math
+import unicodedata
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+def normalize_text(text):
+    # Lowercase and strip accents so "Amélie" is found by "amelie"
+    text = unicodedata.normalize('NFKD', str(text or '').lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(normalize_text(text))
+
+def normalize_title(title):
+    # "Amélie (2001)!" and "amelie 2001" both become "amelie 2001"
+    return ' '.join(tokenize(title))
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# Dice similarity of trigrams a misspelled search word needs to a word of the
+# index, and the most words it is corrected to
+MIN_TERM_SIMILARITY = 0.5
+MAX_TERM_CORRECTIONS = 3
+
+def similar_terms(term, candidates, limit=MAX_TERM_CORRECTIONS):
+    # The candidates most like term by trigram Dice similarity, best first
+    grams = trigrams(term)
+    scored = []
+    for candidate in candidates:
+        candidate_grams = trigrams(candidate)
+        similarity = 2 * len(grams & candidate_grams) / (len(grams) + len(candidate_grams))
+        if similarity >= MIN_TERM_SIMILARITY:
+            scored.append((-similarity, candidate))
+    return [candidate for _, candidate in sorted(scored)[:limit]]
+
+# Dice similarity of title trigrams a title needs to be compared at all,
+# and the difflib ratio of the two titles a fuzzy match needs
+BLOCK_SIMILARITY = 0.5
+MIN_TITLE_SIMILARITY = 0.85
+# Most candidates scored with difflib per title, those sharing the most trigrams
+MAX_SCORED_CANDIDATES = 20
+# Matches a TitleMatcher remembers, it starts over when it has this many
+MATCH_CACHE_SIZE = 100000
+# Years a match may be off by, lists disagree on premiere and release years
+YEAR_TOLERANCE = 1
+LEADING_ARTICLES = ('the ', 'a ', 'an ')
+
+def title_key(title):
+    # normalize_title without a leading article, "The Matrix" is "Matrix"
+    key = normalize_title(title)
+    for article in LEADING_ARTICLES:
+        if key.startswith(article):
+            return key[len(article):]
+    return key
+
+def _known_year(year):
+    # Imported years may be floats or missing, 0 means unknown in the movie dialog
+    if isinstance(year, (int, float)) and year > 0:
+        return int(year)
+    return None
+
+class TitleMatcher:
+    # Finds a free-text title and year among many titles, as typed, imported
+    # or read from an image. Exact title keys are one dict lookup. Other
+    # titles are only compared with the entries of a fitting year that
+    # share enough of their trigrams for a BLOCK_SIMILARITY Dice
+    # coefficient, counted with numpy from the trigram postings, and the
+    # most similar of those are scored with difflib.
+    def __init__(self, titles, years, min_similarity=MIN_TITLE_SIMILARITY,
+                 block_similarity=BLOCK_SIMILARITY):
+        self.min_similarity = min_similarity
+        self.block_similarity = block_similarity
+        self.keys = [title_key(title) for title in titles]
+        self.years = [_known_year(year) for year in years]
+        self.exact = {}
+        for entry, key in enumerate(self.keys):
+            self.exact.setdefault(key, []).append(entry)
+        self._postings = None
+        # {(title, year, fuzzy): match}, the same library is linked on every
+        # refresh of the recommendations
+        self._matches = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _trigram_postings(self):
+        # Built on the first fuzzy match: {trigram: array of the entries
+        # with it}, every entry's trigram count and its year, 0 if unknown
+        if self._postings is None:
+            import numpy as np
+
+            gram_ids = {}
+            entry_grams = []
+            sizes = []
+            for key in self.keys:
+                grams = trigrams(key)
+                sizes.append(len(grams))
+                entry_grams.extend(gram_ids.setdefault(gram, len(gram_ids)) for gram in grams)
+            entry_grams = np.array(entry_grams, dtype=np.int64)
+            # Entries grouped by trigram, views into one array
+            owners = np.repeat(np.arange(len(self.keys)), sizes)[
+                np.argsort(entry_grams, kind='stable')]
+            ends = np.cumsum(np.bincount(entry_grams, minlength=len(gram_ids))).tolist()
+            starts = [0] + ends[:-1]
+            postings = {gram: owners[starts[i]:ends[i]] for gram, i in gram_ids.items()}
+            years = np.array([year or 0 for year in self.years])
+            self._postings = postings, np.array(sizes), years
+        return self._postings
+
+    def _year_distance(self, entry, year):
+        # None when the years rule the entry out, 0 when either is unknown
+        if year is None or self.years[entry] is None:
+            return 0
+        distance = abs(self.years[entry] - year)
+        return distance if distance <= YEAR_TOLERANCE else None
+
+    def _candidates(self, grams, year):
+        # Entries whose trigrams can reach block_similarity Dice with grams
+        # and whose year fits, those sharing the most first. Only the
+        # postings of grams are touched, not every entry.
+        import numpy as np
+
+        postings, sizes, years = self._trigram_postings()
+        hits = sorted((postings[gram] for gram in grams if gram in postings), key=len)
+        # An entry with Dice >= t shares at least t * |grams| / (2 - t) of
+        # them, so it is still found with the most common that - 1 skipped
+        t = self.block_similarity
+        skipped = max(math.ceil(t * len(grams) / (2 - t)) - 1, 0)
+        if skipped >= len(hits):
+            return []
+        entries, shared = np.unique(np.concatenate(hits[:len(hits) - skipped]),
+                                    return_counts=True)
+        # With the skipped ones counted as shared, the most it can be
+        similar = 2 * (shared + skipped) >= t * (len(grams) + sizes[entries])
+        if year is not None:
+            entry_years = years[entries]
+            similar &= (entry_years == 0) | (np.abs(entry_years - year) <= YEAR_TOLERANCE)
+        keep = np.flatnonzero(similar)
+        shared = shared[keep] / (len(grams) + sizes[entries[keep]])
+        if len(keep) > MAX_SCORED_CANDIDATES:
+            best = np.argpartition(-shared, MAX_SCORED_CANDIDATES)[:MAX_SCORED_CANDIDATES]
+            keep, shared = keep[best], shared[best]
+        return entries[keep[np.argsort(-shared, kind='stable')]].tolist()
+
+    def match(self, title, year=None, fuzzy=True):
+        # (entry, similarity) of the best match or None. Several entries with
+        # the title go by year, then by their order.
+        key = title_key(title)
+        year = _known_year(year)
+        best = None
+        for entry in self.exact.get(key, ()):
+            distance = self._year_distance(entry, year)
+            if distance is not None and (best is None or distance < best[0]):
+                best = distance, entry
+        if best is not None:
+            return best[1], 1.0
+        if not fuzzy or not key:
+            return None
+
+        scorer = None
+        # ratio can only reach min_similarity for keys of about the same length
+        t = self.min_similarity
+        shortest, longest = len(key) * t / (2 - t), len(key) * (2 - t) / t
+        ranked = None
+        for entry in self._candidates(trigrams(key), year):
+            entry_key = self.keys[entry]
+            if not shortest <= len(entry_key) <= longest:
+                continue
+            distance = self._year_distance(entry, year)
+            if distance is None:
+                continue
+            if scorer is None:
+                # Only imported once a title needs more than the exact lookup
+                from difflib import SequenceMatcher
+
+                # The query is the second sequence, difflib indexes that one once
+                scorer = SequenceMatcher(None, '', key, autojunk=False)
+            scorer.set_seq1(entry_key)
+            # quick_ratio is an upper bound of ratio and much cheaper, skip
+            # entries that cannot beat the best so far
+            least = t if ranked is None else -ranked[0]
+            if scorer.quick_ratio() < least:
+                continue
+            similarity = scorer.ratio()
+            if similarity < least:
+                continue
+            rank = (-similarity, distance, entry)
+            if ranked is None or rank < ranked:
+                ranked = rank
+        if ranked is None:
+            return None
+        return ranked[2], -ranked[0]
+
+    def match_many(self, pairs, fuzzy=True):
+        # match for every (title, year), each distinct pair is only matched once
+        matches = self._matches
+        results = []
+        for title, year in pairs:
+            pair = title, year, fuzzy
+            if pair not in matches:
+                if len(matches) >= MATCH_CACHE_SIZE:
+                    matches.clear()
+                matches[pair] = self.match(title, year, fuzzy)
+            results.append(matches[pair])
+        return results
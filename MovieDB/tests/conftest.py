@@ -0,0 +1,25 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+# The modules sit flat next to main.py and import each other by name
+MOVIEDB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MOVIEDB_DIR)
+
+from catalog import CATALOG_PATH
+from database import MovieRepository
+
+@pytest.fixture
+def repository(tmp_path):
+    # A new database, set up the way the app opens one
+    repository = MovieRepository(str(tmp_path / 'moviedb.sqlite'))
+    repository.setup()
+    yield repository
+    repository.close()
+
+@pytest.fixture
+def catalog_csv(tmp_path):
+    # A copy, so nothing is written next to the shipped catalog
+    return shutil.copy(os.path.join(MOVIEDB_DIR, CATALOG_PATH), tmp_path / CATALOG_PATH)
@@ -0,0 +1,58 @@
+IN_LIST_COLUMN = 7
+
+def _add_movie(repository, user_id, movie_name, published_year):
+    return repository.add_movie(user_id, {
+        'movie_name': movie_name,
+        'published_year': published_year,
+        'genre': '',
+        'director': '',
+        'actors': '',
+        'imdb_rating': 0,
+        'personal_rating': 0,
+        'watch_date': '',
+        'note': '',
+    })
+
+def _catalog_titles(repository, user_id, **query):
+    return {row[0]: row for row in repository.list_catalog(user_id, **query)}
+
+def test_movie_without_year_is_in_list(repository, catalog_csv):
+    repository.load_catalog(catalog_csv)
+    user_id = repository.register_user('viewer', '', '', '')
+    _add_movie(repository, user_id, 'the godfather', None)
+
+    rows = _catalog_titles(repository, user_id, search='godfather')
+    assert rows['The Godfather'][IN_LIST_COLUMN] == 1
+    assert rows['The Godfather: Part II'][IN_LIST_COLUMN] == 0
+    hidden = _catalog_titles(repository, user_id, search='godfather', hide_listed=True)
+    assert 'The Godfather' not in hidden
+    assert 'The Godfather: Part II' in hidden
+
+def test_movie_from_another_year_is_not_in_list(repository, catalog_csv):
+    repository.load_catalog(catalog_csv)
+    user_id = repository.register_user('viewer', '', '', '')
+    _add_movie(repository, user_id, 'The Godfather', 2020)
+
+    rows = _catalog_titles(repository, user_id, search='godfather')
+    assert rows['The Godfather'][IN_LIST_COLUMN] == 0
+    assert 'The Godfather' in _catalog_titles(repository, user_id, search='godfather',
+                                              hide_listed=True)
+
+def test_search_corrects_misspelled_words(repository, catalog_csv):
+    repository.load_catalog(catalog_csv)
+    user_id = repository.register_user('viewer', '', '', '')
+
+    assert 'The Godfather' in _catalog_titles(repository, user_id, search='godfater')
+    assert list(_catalog_titles(repository, user_id, search='shawshank redemtion')) == [
+        'The Shawshank Redemption']
+    assert 'The Godfather' in _catalog_titles(repository, user_id, search='godfater',
+                                              search_field='title')
+    assert not _catalog_titles(repository, user_id, search='godfater', search_field='director')
+    assert not _catalog_titles(repository, user_id, search='xqzzyv')
+
+def test_search_skips_punctuation_words(repository, catalog_csv):
+    repository.load_catalog(catalog_csv)
+    user_id = repository.register_user('viewer', '', '', '')
+
+    assert list(_catalog_titles(repository, user_id, search='lord of the rings : the return')) == [
+        'The Lord of the Rings: The Return of the King']
@@ -0,0 +1,87 @@
+import gzip
+
+import pytest
+
+from database import MovieRepository
+from imdb_dump import TITLE_TYPES, ingest_dump
+
+from benchmarks.generate import Vocabulary, write_imdb_dump
+
+DUMP_TITLES = 400
+# Small chunks, so every step commits several times
+CHUNK_SIZE = 50
+
+CATALOG_QUERY = '''
+    SELECT tconst, title, year, runtime, genre, imdb_rating, votes, director, stars
+    FROM catalog ORDER BY tconst
+'''
+
+class Interrupted(Exception):
+    pass
+
+def _write_dump(path, catalog_csv, seed=0):
+    path.mkdir(exist_ok=True)
+    return str(write_imdb_dump(str(path), Vocabulary(catalog_csv), DUMP_TITLES, seed))
+
+def _movie_count(directory):
+    with gzip.open(f"{directory}/title.basics.tsv.gz", 'rt', encoding='utf-8') as f:
+        next(f)
+        return sum(line.split('\t')[1] in TITLE_TYPES for line in f)
+
+def _fresh_catalog(tmp_path, directory):
+    repository = MovieRepository(str(tmp_path / 'fresh.sqlite'))
+    try:
+        repository.setup()
+        ingest_dump(repository, directory, CHUNK_SIZE)
+        return repository.fetchall(CATALOG_QUERY)
+    finally:
+        repository.close()
+
+def test_ingest_fills_catalog(repository, catalog_csv, tmp_path):
+    repository.load_catalog(catalog_csv)
+    directory = _write_dump(tmp_path / 'dump', catalog_csv)
+
+    rows = ingest_dump(repository, directory, CHUNK_SIZE)
+
+    movies = _movie_count(directory)
+    assert rows['title.basics'] == movies
+    # The dump replaces the top 1000 titles of the CSV
+    assert repository.fetchone('SELECT COUNT(*) FROM catalog')[0] == movies
+    assert repository.fetchone('SELECT COUNT(*) FROM catalog WHERE tconst IS NULL')[0] == 0
+    assert repository.fetchone('''
+        SELECT COUNT(*) FROM catalog WHERE director IS NULL OR stars IS NULL
+    ''')[0] == 0
+    title = repository.fetchone('SELECT title FROM catalog ORDER BY tconst')[0]
+    user_id = repository.register_user('viewer', '', '', '')
+    assert title in [row[0] for row in repository.list_catalog(user_id, search=title)]
+
+@pytest.mark.parametrize('interrupted_step', ['title.basics', 'title.principals', 'people'])
+def test_interrupted_ingest_resumes(repository, catalog_csv, tmp_path, interrupted_step):
+    directory = _write_dump(tmp_path / 'dump', catalog_csv)
+
+    def interrupt(step, share, rows):
+        if step == interrupted_step and share < 1.0:
+            raise Interrupted
+
+    with pytest.raises(Interrupted):
+        ingest_dump(repository, directory, CHUNK_SIZE, interrupt)
+    assert repository.fetchone('SELECT done FROM catalog_ingest WHERE step=?',
+                               (interrupted_step,))[0] == 0
+
+    ingest_dump(repository, directory, CHUNK_SIZE)
+    assert repository.fetchall(CATALOG_QUERY) == _fresh_catalog(tmp_path, directory)
+
+def test_changed_dump_restarts_ingest(repository, catalog_csv, tmp_path):
+    directory = _write_dump(tmp_path / 'dump', catalog_csv)
+    ingest_dump(repository, directory, CHUNK_SIZE)
+
+    # Other titles under the same tconsts, as when the dump is downloaded again
+    _write_dump(tmp_path / 'dump', catalog_csv, seed=1)
+    rows = ingest_dump(repository, directory, CHUNK_SIZE)
+
+    # Every title of the new files is read again. Titles they no longer
+    # have as movies stay, the ingest only updates by tconst.
+    assert rows['title.basics'] == _movie_count(directory)
+    ingested = {row[0]: row[:5] for row in repository.fetchall(CATALOG_QUERY)}
+    for row in _fresh_catalog(tmp_path, directory):
+        assert ingested[row[0]] == row[:5]
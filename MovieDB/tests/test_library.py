@@ -0,0 +1,49 @@
+NAME_COLUMN = 0
+
+def _add_movie(repository, user_id, movie_name, actors=''):
+    return repository.add_movie(user_id, {
+        'movie_name': movie_name,
+        'published_year': 2000,
+        'genre': '',
+        'director': '',
+        'actors': actors,
+        'imdb_rating': 0,
+        'personal_rating': 0,
+        'watch_date': '',
+        'note': '',
+    })
+
+def _searched_names(repository, user_id, search):
+    return [row[NAME_COLUMN] for row in repository.list_movies(user_id, search=search)]
+
+def _names_with_actors(repository, user_id, actor_filter):
+    return sorted(row[NAME_COLUMN]
+                  for row in repository.list_movies(user_id, actor_filter=actor_filter))
+
+def test_search_matches_titles_with_punctuation(repository):
+    user_id = repository.register_user('viewer', '', '', '')
+    _add_movie(repository, user_id, 'Rock & Roll')
+    _add_movie(repository, user_id, 'Spider-Man: No Way Home')
+    _add_movie(repository, user_id, 'Rocky')
+
+    assert _searched_names(repository, user_id, 'rock & roll') == ['Rock & Roll']
+    assert _searched_names(repository, user_id, 'spider-man : no way') == [
+        'Spider-Man: No Way Home']
+    assert sorted(_searched_names(repository, user_id, '&')) == [
+        'Rock & Roll', 'Rocky', 'Spider-Man: No Way Home']
+
+def test_actor_filter_matches_any_word_of_a_name(repository):
+    user_id = repository.register_user('viewer', '', '', '')
+    _add_movie(repository, user_id, 'Sleepless in Seattle', 'Tom Hanks, Meg Ryan')
+    _add_movie(repository, user_id, 'Top Gun', 'Tom Cruise, Kelly McGillis')
+    _add_movie(repository, user_id, 'Big', 'Tom Hanks, Elizabeth Perkins')
+
+    assert _names_with_actors(repository, user_id, 'hanks') == ['Big', 'Sleepless in Seattle']
+    assert _names_with_actors(repository, user_id, 'han') == ['Big', 'Sleepless in Seattle']
+    assert _names_with_actors(repository, user_id, 'tom') == [
+        'Big', 'Sleepless in Seattle', 'Top Gun']
+    assert _names_with_actors(repository, user_id, 'tom cruise') == ['Top Gun']
+    assert _names_with_actors(repository, user_id, 'hanks, ryan') == ['Sleepless in Seattle']
+    assert _names_with_actors(repository, user_id, 'ryan | mcgillis') == [
+        'Sleepless in Seattle', 'Top Gun']
+    assert _names_with_actors(repository, user_id, 'cruise, ryan') == []
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+# No display is needed for the models
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import QCoreApplication
+
+from models import MovieTableModel
+
+MIXED_TYPES_ERROR = "'<' not supported between instances of 'str' and 'int'"
+
+@pytest.fixture
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+def _failing_queries(limit, offset=0, after=None, **query):
+    # A fallback entry, called with the connection once the page is empty
+    def fail(conn):
+        raise TypeError(MIXED_TYPES_ERROR)
+    return [fail]
+
+def test_failed_page_query_lets_the_model_load_again(app, repository, monkeypatch):
+    user_id = repository.register_user('viewer', '', '', '')
+    model = MovieTableModel(repository, user_id)
+    failures = []
+    model.query_failed.connect(failures.append)
+    monkeypatch.setattr(model, 'page_queries', _failing_queries)
+
+    model.set_query_async(search='godfather')
+    model.wait_for_query()
+    app.processEvents()
+
+    assert failures == [MIXED_TYPES_ERROR]
+    assert not model.is_loading()
+    assert model.canFetchMore()
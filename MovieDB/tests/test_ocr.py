@@ -0,0 +1,68 @@
+import pytest
+
+from catalog import file_hash, load_catalog_snapshot
+from ocr import import_images
+
+# Backends run in spawned worker processes, so the stubs are module-level
+def text_file_backend(path):
+    # The "image" is a text file holding what the OCR would read off it
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def failing_backend(path):
+    raise RuntimeError("the backend was called")
+
+WATCH_LIST = """Movies to watch
+1. The Godfather (1972)
+2) Pulp Fiction
+- The Shawshank Redemption 1994
+* Some Film Nobody Made (2031)
+"""
+
+@pytest.fixture
+def images(tmp_path):
+    watch_list = tmp_path / 'watch_list.png'
+    watch_list.write_text(WATCH_LIST, encoding='utf-8')
+    # Not text, the stub fails on it as tesseract does on a broken image
+    broken = tmp_path / 'broken.png'
+    broken.write_bytes(b'\x89PNG\r\n\x1a\n\xff\xfe\xfd')
+    return [str(watch_list), str(broken)]
+
+def _movie_names(repository, user_id):
+    return sorted(row[0] for row in repository.list_movies(user_id))
+
+def test_import_images(repository, catalog_csv, images):
+    catalog = load_catalog_snapshot(catalog_csv)
+    user_id = repository.register_user('viewer', '', '', '')
+    repository.add_movie(user_id, {'movie_name': 'The Shawshank Redemption',
+                                   'published_year': 1994})
+    watch_list, broken = images
+
+    result = import_images(repository, user_id, images, catalog, backend=text_file_backend,
+                           max_workers=2)
+    assert not result.cancelled
+    assert result.image_count == 2
+    assert result.cached_count == 0
+    assert result.import_result.success_count == 2
+    assert sorted(result.matched) == ['Pulp Fiction', 'The Godfather']
+    assert result.already_listed == ['The Shawshank Redemption']
+    # Headings read like entries too, they are reported as not found
+    assert result.unmatched == ['Movies to watch', 'Some Film Nobody Made (2031)']
+    assert [path for path, _ in result.failed_images] == [broken]
+    assert _movie_names(repository, user_id) == [
+        'Pulp Fiction', 'The Godfather', 'The Shawshank Redemption']
+    report = result.report()
+    assert f"Could not read {broken}" in report
+    assert "Not found: Some Film Nobody Made (2031)" in report
+
+    # The unchanged image is read from ocr_cache, only the broken one goes to
+    # the backend again
+    assert list(repository.get_ocr_texts([file_hash(watch_list)]).values()) == [WATCH_LIST]
+    result = import_images(repository, user_id, images, catalog, backend=failing_backend,
+                           max_workers=2)
+    assert result.cached_count == 1
+    assert result.failed_images == [(broken, "the backend was called")]
+    assert result.import_result.success_count == 0
+    assert sorted(result.already_listed) == [
+        'Pulp Fiction', 'The Godfather', 'The Shawshank Redemption']
+    assert result.unmatched == ['Movies to watch', 'Some Film Nobody Made (2031)']
@@ -0,0 +1,50 @@
+import threading
+
+from database import MIGRATIONS, MovieRepository
+
+from benchmarks.generate import Vocabulary, generate_library
+
+def test_ui_queries_use_indexes(tmp_path, catalog_csv):
+    # A library large enough for the planner's statistics to matter
+    path = str(tmp_path / 'library.sqlite')
+    user_ids = generate_library(path, Vocabulary(catalog_csv), users=3, movies_per_user=3000)
+    repository = MovieRepository(path)
+    try:
+        repository.setup()
+        repository.load_catalog(catalog_csv)
+        assert repository.find_full_scans(user_ids[0]) == []
+    finally:
+        repository.close()
+
+# New databases the concurrent setup is tried on, the race is not hit every time
+SETUP_RACES = 10
+
+def _race_setup(path, count):
+    # Errors of count repositories set up at the same moment
+    repositories = [MovieRepository(path) for _ in range(count)]
+    start = threading.Barrier(count)
+    errors = []
+
+    def setup(repository):
+        start.wait()
+        try:
+            repository.setup()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=setup, args=(repository,)) for repository in repositories]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    version = repositories[0].schema_version()
+    for repository in repositories:
+        repository.close()
+    return errors, version
+
+def test_concurrent_setup_migrates_once(tmp_path):
+    # Like the app and imdb_dump.py started together on a new database
+    for race in range(SETUP_RACES):
+        errors, version = _race_setup(str(tmp_path / f'moviedb{race}.sqlite'), 4)
+        assert errors == []
+        assert version == len(MIGRATIONS)
@@ -0,0 +1,25 @@
+import os
+import sys
+import shutil
+import subprocess
+
+from catalog import CATALOG_PATH
+from database import DATABASE_PATH
+
+MOVIEDB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _profile_startup(work_dir):
+    # main.py as the app is started, from a directory with its database and catalog
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    return subprocess.run([sys.executable, os.path.join(MOVIEDB_DIR, 'main.py'),
+                           '--profile-startup'],
+                          cwd=work_dir, env=env, capture_output=True, text=True, timeout=60)
+
+def test_startup_within_budget(tmp_path):
+    # The shipped database, so the first run also upgrades its schema
+    shutil.copy(os.path.join(MOVIEDB_DIR, DATABASE_PATH), tmp_path)
+    shutil.copy(os.path.join(MOVIEDB_DIR, CATALOG_PATH), tmp_path)
+    for _ in range(2):
+        result = _profile_startup(tmp_path)
+        # The report says what was loaded too early or took too long
+        assert result.returncode == 0, result.stderr